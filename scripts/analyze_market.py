@@ -1,33 +1,18 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-import os, sys, json
+import os, sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from wk_rank import top
 
-CACHE_DIR = os.path.join(os.getcwd(), "cache")
 UNITS  = {"kr": "MKRW", "us": "MUSD", "ix": "MIDX"}
 TITLES = {"kr": "KR", "us": "US", "ix": "IDX"}
 FLAGS  = {"kr": "🇰🇷", "us": "🇺🇸", "ix": "📈"}
 TOP_LIMIT = 7  # ← 변경
 
-def _load_json(path):
-    if not os.path.exists(path): return {}
-    with open(path,"r",encoding="utf-8") as f:
-        return json.load(f)
-
-def load_market(market):
-    name = {"kr":"all_kr_15m.json","us":"all_us_15m.json","ix":"all_ix_15m.json"}.get(market)
-    if not name: return {}
-    return _load_json(os.path.join(CACHE_DIR,name))
-
 def collect_top(market, limit=TOP_LIMIT):
-    rows = []
-    for code,item in load_market(market).items():
-        en = item.get("energies")
-        if not en: continue
-        try: val = float(en[-1])
-        except: continue
-        rows.append((val,item.get("name",code),code,item.get("symbol",code)))
-    rows.sort(key=lambda x:x[0], reverse=True)
-    return rows[:limit]
+    # 빌드 때 만든 순위 인덱스(rank_*_15m.json)에서 바로
+    if market not in UNITS: return []
+    return [(r["energy"],r["name"],r["key"],r["symbol"]) for r in top(market, "15m", limit)]
 
 def format_market(market, rows):
     flag=FLAGS[market]; title=TITLES[market]; unit=UNITS[market]
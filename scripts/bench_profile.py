@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# collect_profile 마이크로벤치: 기존 파이썬 이중 루프 vs NumPy 벡터화
+#   python3 scripts/bench_profile.py [cache/all_kr_1d.json] [반복수]
+import os, sys, json, math, time
+import pandas as pd
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from wk_feed_quant import collect_profile
+
+def collect_profile_loop(df):
+    # 벡터화 이전 구현 (출력 비교 기준)
+    pf = {}
+    o = df["open"].values; h = df["high"].values
+    l = df["low"].values;  c = df["close"].values
+    v = df["volume"].values
+    last_high = h[-1]
+    digits = int(math.floor(math.log10(last_high)))
+    step = max(0.01, 10 ** (digits - 3))
+    w_o, w_l, w_h, w_c = 0.2, 0.3, 0.3, 0.2
+    for i in range(len(c)):
+        vv = v[i] if v[i] > 0 else 10
+        for price, w in ((o[i], w_o), (l[i], w_l), (h[i], w_h), (c[i], w_c)):
+            slot = int((price + (0.5 * step)) / step)
+            pf[slot] = pf.get(slot, 0) + int(round(vv * w))
+    pf_sorted = {round(slot * step, 2): vol for slot, vol in sorted(pf.items(), key=lambda x: x[1], reverse=True)}
+    return pf_sorted, set(pf_sorted.keys())
+
+def bench(fn, frames, reps):
+    t = time.perf_counter()
+    for _ in range(reps):
+        for df in frames: fn(df)
+    return (time.perf_counter() - t) / reps
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else "cache/all_kr_1d.json"
+    reps = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    with open(path, "r", encoding = "utf-8") as f:
+        data = json.load(f)
+    frames = [pd.DataFrame(it["ohlcv"]) for it in data.values() if it.get("ohlcv", {}).get("close")]
+    bars = sum(len(df) for df in frames)
+
+    bad = 0
+    for df in frames:
+        a, b = collect_profile_loop(df), collect_profile(df)
+        if list(a[0].items()) != list(b[0].items()) or a[1] != b[1]: bad += 1
+    print(f"📂 {path}: {len(frames)}종목 / {bars}봉, 출력 불일치 {bad}건")
+
+    t_loop = bench(collect_profile_loop, frames, reps)
+    t_vec = bench(collect_profile, frames, reps)
+    print(f"  loop  {t_loop*1000:8.2f} ms/버킷  ({t_loop/len(frames)*1e6:7.1f} µs/종목)")
+    print(f"  numpy {t_vec*1000:8.2f} ms/버킷  ({t_vec/len(frames)*1e6:7.1f} µs/종목)")
+    print(f"  → {t_loop/t_vec:.1f}x")
+    sys.exit(1 if bad else 0)
@@ -1,22 +1,15 @@
-import json, os
+import os, sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from wk_cache_reader import bucket_path
+from wk_rank import top as top_rows
 
-path = "cache/all_kr_15m.json"
+path = bucket_path("kr", "15m")
 if not os.path.exists(path):
     print("❌ cache missing:", path)
     exit(1)
 
-with open(path, encoding="utf-8") as f:
-    data = json.load(f)
-
-items = []
-for code, it in data.items():
-    name = it.get("name", code)
-    ea = it.get("energies", [])
-    last = ea[-1] if ea else 0.0
-    items.append((last, code, name))
-
-items.sort(reverse=True)
-top = items[:7]
+# 빌드 때 만든 순위 인덱스(rank_kr_15m.json)에서 상위 7개만
+top = [(r["energy"], r["key"], r["name"]) for r in top_rows("kr", "15m", 7)]
 
 print("🇰🇷 KR 15m Top 7 (MKRW)")
 for i, (v, code, name) in enumerate(top, 1):
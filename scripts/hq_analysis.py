@@ -1,10 +1,13 @@
 #!/usr/bin/env python3
-import json, sys, time, os
+import sys, time, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from wk_cache_reader import bucket_path
+from wk_rank import top
 
 TARGET = sys.argv[1]
-cache_dir = os.path.join(os.getcwd(), "cache")
-fn = "all_kr_15m.json" if TARGET == "KR" else "all_us_15m.json"
-path = os.path.join(cache_dir, fn)
+market = "kr" if TARGET == "KR" else "us"
+path = bucket_path(market, "15m")
+fn = os.path.basename(path)
 
 print(f"📂 Loading {fn}")
 time.sleep(0.6)
@@ -14,27 +17,16 @@ if not os.path.exists(path):
     sys.exit(1)
 
 try:
-    with open(path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    # 빌드 때 만든 순위 인덱스(rank_*_15m.json)에서 상위 7개만
+    top7 = [(r["name"], r["key"], r["energy"]) for r in top(market, "15m", 7)]
 except Exception as e:
     print("⚠️ JSON 파싱 실패:", repr(e))
     sys.exit(1)
 
-items = []
-for code, item in data.items():
-    try:
-        last = float(item.get("energies", [])[-1])
-        items.append((item["name"], code, last))
-    except:
-        continue
-
-if not items:
+if not top7:
     print("⚠️ 에너지 데이터 없음")
     sys.exit(1)
 
-items.sort(key=lambda x: x[2], reverse=True)
-top7 = items[:7]
-
 unit = "MKRW" if TARGET == "KR" else "MUSD"
 mul = 1000 if TARGET == "KR" else 1
 
@@ -1,8 +1,13 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import os, json, yfinance as yf
+import os
+import numpy as np
 import pandas as pd
+from wk_cache_reader import get_market
+from wk_panel import build_panel
+from wk_sectors import SectorStore
+import wk_sector_series
 
 #────────────────────────────────────────
 # ANSI 컬러
@@ -34,125 +39,205 @@ def classify_etf(t):
     return None
 
 #────────────────────────────────────────
-# 야후 섹터 추출 + ETF 우선
+# KR 테마 (종목명 키워드, 앞의 것 우선) / IX 상품군
 #────────────────────────────────────────
-def ysec(ticker):
-    etf=classify_etf(ticker)
-    if etf: return etf
-    try:
-        info=yf.Ticker(ticker).info
-        return info.get("sector") or "Unknown"
-    except:
-        return "Unknown"
+KR_THEMES=(
+    (("인버스",),"인버스"),
+    (("레버리지","2X"),"레버리지"),
+    (("반도체",),"반도체"),
+    (("2차전지",),"2차전지"),
+    (("조선",),"조선"),
+    (("건설",),"건설"),
+    (("증권","금융","은행","생명","해상"),"금융"),
+    (("커버드콜","배당"),"배당·커버드콜"),
+    (("미국","나스닥","S&P","글로벌"),"해외지수"),
+    (("200","코스피","코스닥"),"KR 지수"),
+    (("자동차","현대차"),"자동차"),
+    (("금현물","원유"),"원자재"),
+    (("전력","전선","원자력","에너빌리티"),"전력"),
+)
+KR_ETF_BRANDS=("KODEX","TIGER","SOL","ACE","RISE","TIME","WON","PLUS","HANARO","KBSTAR","ARIRANG","KOSEF")
+
+def classify_kr(name):
+    nm=(name or "").upper()
+    for keys,theme in KR_THEMES:
+        if any(k.upper() in nm for k in keys): return theme
+    if nm.split(" ")[0] in KR_ETF_BRANDS or "ETN" in nm: return "기타 ETF"
+    return None
 
-#────────────────────────────────────────
-# 캐시 로드
-#────────────────────────────────────────
-def load_cache(path):
-    try:
-        with open(path,"r",encoding="utf-8") as f: return json.load(f)
-    except:
-        print(f"⚠️ 파일 로드 실패: {path}")
-        return {}
+def classify_ix(t):
+    t=t.upper()
+    if t in ("^KS11","^KQ11","^KS200"): return "KR Index"
+    if t in ("^NDX","^DJI","^GSPC","^IXIC","^RUT"): return "US Index"
+    if t=="^VIX": return "Volatility"
+    if t.startswith("^"): return "Global Index"
+    if t.endswith("=F"):
+        root=t[:-2]
+        if root in ("CL","BZ","NG","RB","HO"): return "Energy Fut"
+        if root in ("GC","SI","HG","PL","PA"): return "Metals Fut"
+        if root in ("ES","NQ","YM","RTY"): return "Index Fut"
+        return "Futures"
+    if t.endswith("=X") or t.startswith("DX-"): return "FX"
+    if t.endswith("-USD"): return "Crypto"
+    return "Other"
 
 #────────────────────────────────────────
-# 종목 에너지 계산 (MUSD)
+# 야후 섹터 추출 + ETF/테마 우선
+#   cache/sector_map.json 에 TTL 로 저장 (wk_sectors) — 스냅샷 전에 resolve() 한 번으로 전 종목
 #────────────────────────────────────────
-def compute_energy(ohlcv):
-    try:
-        c=ohlcv.get("close",[]); v=ohlcv.get("volume",[])
-        if len(c)<28: return 0,0,0,0,0
-        last=float(c[-1])*float(v[-1])*1e-6
-        prev=float(c[-2])*float(v[-2])*1e-6
-        prev1=float(c[-27])*float(v[-27])*1e-6
-        d15=last-prev; d1d=last-prev1
-        return last,prev,prev1,d15,d1d
-    except:
-        return 0,0,0,0,0
+def seed_sector(market,code,name):
+    if market=="kr": return classify_kr(name)
+    if market=="ix": return classify_ix(code)
+    return classify_etf(code)
+
+SECTORS=SectorStore(seed=seed_sector)
+SECTORS_JOIN=float(os.environ.get("WK_SECTOR_JOIN","20") or 0)
 
 #────────────────────────────────────────
-# 섹터 스냅샷
+# 되돌아볼 시점 (MUSD 에너지 비교 기준)
+#   prev = 한 봉 간격 전(15m 봉이면 15분 전), prev1 = 직전 세션의 같은 장중 시각 (wk_session.lookback_ms)
+#   그 시각 이전 마지막 봉을 ts 에 searchsorted 로 찾는다 — 반일장·세션 길이·결측 봉에도 맞는 봉.
+#   일봉/주봉은 ts 가 현지 자정이라 달력 기준 시간 전의 마지막 봉 (일봉: 1일/1주, 주봉: 1주/4주).
 #────────────────────────────────────────
-def sector_snapshot(cache):
-    rows=[]
-    for cd,it in cache.items():
-        sec=ysec(cd)
-        last,prev,prev1,d15,d1d=compute_energy(it.get("ohlcv",{}))
-        rows.append((cd,sec,last,prev,prev1,d15,d1d))
-
-    df=pd.DataFrame(rows,columns=["code","sector","last","prev","prev1","d15","d1d"])
+LABELS={"24h":"1d","168h":"1wk","672h":"4wk"}
 
-    #───────────────────────────────
-    # ETC ETF 통합
-    #───────────────────────────────
-    sector_counts=df.groupby("sector")["code"].count().to_dict()
-    major=set([
-        "Index ETF","NASDAQ 3x","S&P500 3x","Semiconductor 3x",
-        "Tech 3x","DOW 3x Inv","Megacap Leveraged","Bitcoin Proxy",
-        "EV Leveraged"
-    ])
+def lookbacks(interval="15m"):
+    if interval.endswith("m") or interval.endswith("h"): return {"prev":interval,"prev1":"1d"}
+    if interval=="1wk": return {"prev":"168h","prev1":"672h"}
+    return {"prev":"24h","prev1":"168h"}
 
-    def normalize(s):
-        if s not in major and "ETF" in s and sector_counts.get(s,0)==1:
-            return "ETC ETF"
-        return s
-
-    df["sector"]=df["sector"].apply(normalize)
+#────────────────────────────────────────
+# 전 종목 에너지 (패널로 한 번에) — 캐시에 저장된 energies 그대로 (빌드 때 wk_energy 로 계산, 소수 3자리)
+#────────────────────────────────────────
+def energy_frame(cache,market="us",interval="15m"):
+    p=build_panel(cache,fields=("energy",),align="tail")
+    e=p["energy"]
+    lb=lookbacks(interval)
+    last=p.last(e); prev=p.ago(e,lb["prev"],market); prev1=p.ago(e,lb["prev1"],market)
+    # 되돌아볼 봉이 없거나 값이 빈 종목은 0
+    ok=~np.isnan(last)&~np.isnan(prev)&~np.isnan(prev1)
+    z=lambda a: np.where(ok,a,0.0)
+    return pd.DataFrame({"code":p.keys,"name":p.names,"symbol":p.symbols,"ts":p.last_ts(),
+                         "last":z(last),"prev":z(prev),"prev1":z(prev1),
+                         "d15":z(last-prev),"d1d":z(last-prev1)})
 
-    # 재집계
-    sec_now=df.groupby("sector")["last"].sum()
-    sec_prev=df.groupby("sector")["prev"].sum()
-    sec_prev1=df.groupby("sector")["prev1"].sum()
-    sec_d15=df.groupby("sector")["d15"].sum()
-    sec_d1d=df.groupby("sector")["d1d"].sum()
+#────────────────────────────────────────
+# 섹터 집계 — 지표 합계·섹터별 TOP k 리더를 그룹 패스 한 번에
+#   결과: {"market","interval","unit","labels":(Δ prev, Δ prev1 창 이름),"bar_ts","symbols","sectors":[
+#          {"sector","count","now","prev","prev1","d15","d1d","leaders":[{code,name,last,prev,prev1,d15,d1d}…]}…]}
+#   sectors 는 Δ1d 큰 순 (세력 이동), leaders 도 섹터 안에서 Δ1d 큰 순.
+#────────────────────────────────────────
+MAJOR=set([
+    "Index ETF","NASDAQ 3x","S&P500 3x","Semiconductor 3x",
+    "Tech 3x","DOW 3x Inv","Megacap Leveraged","Bitcoin Proxy",
+    "EV Leveraged"
+])
+METRICS=("last","prev","prev1","d15","d1d")
+UNITS={"us":"MUSD","kr":"MKRW","ix":"M"}
+
+def aggregate(df,k=3):
+    """df(code,name,sector,last,prev,prev1,d15,d1d) → 섹터 목록 (Δ1d 큰 순)"""
+    if not len(df): return []
+    sec=df["sector"].astype(str).to_numpy()
+    u,inv,cnt=np.unique(sec,return_inverse=True,return_counts=True)
+    # ETC ETF 통합: 종목 하나뿐인 기타 ETF 섹터
+    lone=np.array([s not in MAJOR and "ETF" in s for s in u])&(cnt==1)
+    if lone.any():
+        sec=np.where(lone[inv],"ETC ETF",sec)
+        u,inv,cnt=np.unique(sec,return_inverse=True,return_counts=True)
+    inv=inv.ravel()
+    M=df[list(METRICS)].to_numpy(dtype="float64")
+    sums=np.zeros((len(u),len(METRICS)))
+    np.add.at(sums,inv,M)
+    # 섹터 → Δ1d 내림차순 → 원래 순서, 한 번 정렬해 섹터마다 앞 k 개
+    o=np.lexsort((np.arange(len(df)),-M[:,4],inv))
+    g=inv[o]
+    pos=np.arange(len(o))-np.searchsorted(g,g)
+    leaders={}
+    codes=df["code"].tolist(); names=df["name"].tolist()
+    for i in o[pos<k]:
+        leaders.setdefault(inv[i],[]).append(dict(code=codes[i],name=names[i],**dict(zip(METRICS,M[i].tolist()))))
+    out=[]
+    for gi in np.lexsort((np.arange(len(u)),-sums[:,4])):
+        row=dict(zip(("now","prev","prev1","d15","d1d"),sums[gi].tolist()))
+        out.append(dict(sector=str(u[gi]),count=int(cnt[gi]),**row,leaders=leaders.get(gi,[])))
+    return out
+
+def sector_report(market="us",interval="15m",k=3,cache=None,cache_dir=None):
+    """시장 버킷 → 섹터 집계 결과 (캐시 없으면 None)"""
+    if cache is None:
+        cache=get_market(market,interval,columns=("ts","energy"),cache_dir=cache_dir)
+    if not cache: return None
+    df=energy_frame(cache,market,interval)
+    sec=SECTORS.resolve(list(df["code"]),market,names=dict(zip(df["code"],df["name"])),
+                        symbols=dict(zip(df["code"],df["symbol"])))
+    df.insert(1,"sector",[sec[cd] for cd in df["code"]])
+    lb=lookbacks(interval)
+    return {"market":market,"interval":interval,"unit":UNITS.get(market,"M"),
+            "labels":tuple(LABELS.get(w,w) for w in lb.values()),
+            "bar_ts":int(df["ts"].max()) if len(df) else 0,"symbols":len(df),"sectors":aggregate(df,k)}
 
-    #───────────────────────────────
-    # 정렬 기준 = Δ1d 큰 순 (세력 이동)
-    #───────────────────────────────
-    order = sec_d1d.sort_values(ascending=False).index
+#────────────────────────────────────────
+# 텍스트 렌더러
+#────────────────────────────────────────
+def render(rep,color=True):
+    unit=rep["unit"]; l15,l1d=rep["labels"]; lines=[]
+    colorize_=colorize if color else (lambda v,txt: txt)
+    pct=lambda d,p: (d/p*100) if p else 0
+    tag="" if rep["market"]=="us" and rep["interval"]=="15m" else f" [{rep['market'].upper()} {rep['interval']}]"
+    lines.append(f"\n📊 섹터 총 에너지 (현재, Δ{l1d} 큰 순 정렬){tag}")
+    for s in rep["sectors"]:
+        d15=s["d15"]; d1d=s["d1d"]
+        d15_txt = colorize_(d15, f"{d15:+8.3f}/{pct(d15,s['prev']):+6.2f}%")
+        d1d_txt = colorize_(d1d, f"{d1d:+8.3f}/{pct(d1d,s['prev1']):+6.2f}%")
+        lines.append(f"  {s['sector']:24s} {s['now']:12.3f} {unit}")
+        lines.append(f"\t   (Δ{l15}:{d15_txt} , Δ{l1d}:{d1d_txt})")
+    lines.append(f"\n🔥 섹터별 TOP3 에너지 리더 (Δ{l1d} 큰 순 정렬){tag}")
+    for s in rep["sectors"]:
+        lines.append(f"\n[{s['sector']}]")
+        for r in s["leaders"]:
+            d15=r["d15"]; d1d=r["d1d"]
+            d15_txt = colorize_(d15, f"{d15:+7.2f}/{pct(d15,r['prev']):+6.2f}%")
+            d1d_txt = colorize_(d1d, f"{d1d:+7.2f}/{pct(d1d,r['prev1']):+6.2f}%")
+            label=r["code"] if rep["market"]=="us" else r["name"]
+            lines.append(f"  {label:8s}  energy={r['last']:10.2f} {unit}   "
+                         f"(Δ{l15}:{d15_txt} , Δ{l1d}:{d1d_txt})")
+    return "\n".join(lines)
 
-    return df,order,sec_now,sec_prev,sec_prev1,sec_d15,sec_d1d
+#────────────────────────────────────────
+# 브리핑 (send_briefing 이 같은 프로세스에서 부른다)
+#   {"interval", "reports": [sector_report …], "missing": [캐시 없는 시장 …]}
+#   record=True 면 섹터·리더 지표를 시계열에 (cache/sector_series, 같은 봉이면 건너뜀)
+#────────────────────────────────────────
+def briefing(markets=("us",),interval="15m",k=3,record=True):
+    out={"interval":interval,"reports":[],"missing":[]}
+    for mk in markets:
+        rep=sector_report(mk,interval,k)
+        if rep is None:
+            out["missing"].append(mk); continue
+        out["reports"].append(rep)
+        if record: wk_sector_series.append(rep)
+    return out
+
+def render_briefing(b,color=True):
+    lines=[]
+    for mk in b["missing"]:
+        lines.append(f"⚠️ 현재 캐시 없음 ({mk} {b['interval']})" if len(b["missing"])+len(b["reports"])>1 else "⚠️ 현재 캐시 없음")
+    lines+=[render(rep,color) for rep in b["reports"]]
+    return "\n".join(lines)
+
+def finish(timeout=None):
+    """늦게 도착한 섹터도 다음 실행을 위해 저장"""
+    SECTORS.join(timeout=SECTORS_JOIN if timeout is None else timeout)
 
 #────────────────────────────────────────
-# 메인
+# 메인: sector_weather.py [us|kr|ix …] [15m|1m|1d|1wk]  (기본 us 15m)
 #────────────────────────────────────────
 if __name__=="__main__":
-    path="cache/all_us_15m.json"
-    now=load_cache(path)
-    if not now:
-        print("⚠️ 현재 캐시 없음"); exit(0)
-
-    df,order,sec_now,sec_prev,sec_prev1,sec_d15,sec_d1d = sector_snapshot(now)
-
-    print("\n📊 섹터 총 에너지 (현재, Δ1d 큰 순 정렬)")
-    for s in order:
-        now_v = sec_now[s]
-        d15   = sec_d15.get(s,0)
-        p15   = sec_prev.get(s,0)
-        pct15 = (d15/p15*100) if p15 else 0
-        d1d   = sec_d1d.get(s,0)
-        p1d   = sec_prev1.get(s,0)
-        pct1d = (d1d/p1d*100) if p1d else 0
-
-        d15_txt = colorize(d15, f"{d15:+8.3f}/{pct15:+6.2f}%")
-        d1d_txt = colorize(d1d, f"{d1d:+8.3f}/{pct1d:+6.2f}%")
-
-        print(f"  {s:24s} {now_v:12.3f} MUSD")
-        print(f"\t   (Δ15m:{d15_txt} , Δ1d:{d1d_txt})")
-
-    print("\n🔥 섹터별 TOP3 에너지 리더 (Δ1d 큰 순 정렬)")
-    for s in order:
-        top=df[df["sector"]==s].sort_values("d1d",ascending=False).head(3)
-        print(f"\n[{s}]")
-        for _,r in top.iterrows():
-            last=r["last"]; prev=r["prev"]; prev1=r["prev1"]
-            d15=r["d15"];  d1d=r["d1d"]
-            pct15=(d15/prev*100) if prev else 0
-            pct1d=(d1d/prev1*100) if prev1 else 0
-
-            d15_txt = colorize(d15, f"{d15:+7.2f}/{pct15:+6.2f}%")
-            d1d_txt = colorize(d1d, f"{d1d:+7.2f}/{pct1d:+6.2f}%")
-
-            print(f"  {r['code']:8s}  energy={last:10.2f} MUSD   "
-                  f"(Δ15m:{d15_txt} , Δ1d:{d1d_txt})")
-
+    import sys
+    args=[a.lower() for a in sys.argv[1:]]
+    markets=[a for a in args if a in UNITS] or ["us"]
+    interval=next((a for a in args if a not in UNITS),"15m")
+    b=briefing(markets,interval)
+    print(render_briefing(b))
+    if b["reports"]: finish()
@@ -1,94 +1,75 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-import os, re
 from telegram_notify import send_text, send_voice
+import sector_weather, wk_tts
+from concurrent.futures import ThreadPoolExecutor
 
 BRIEF = "briefing.txt"
 
 # ----------------------------------------------------------
 # ① 음성용 초요약 생성기 (현재 시간 포함, KST 기준)
+#    sector_weather.briefing() 의 구조(첫 시장 리포트)에서 바로 뽑는다
 # ----------------------------------------------------------
-def make_voice_summary(full_text:str)->str:
+def make_voice_summary(report)->str:
     from datetime import datetime,timedelta
-    import re
     now_kst=datetime.utcnow()+timedelta(hours=9)
     tstr=now_kst.strftime("%d일 %H시 %M분")
-    text=re.sub(r'\x1b\[[0-9;]*m','',full_text)
-    text=text.replace('\n\t','\t')
-    lines=text.splitlines()
-    SECTOR_LINE_RE=re.compile(r'^\s*(?P<name>[A-Za-z0-9&.\- ]+?)\s{2,}(?P<energy>[0-9,]+(?:\.[0-9]+)?)\s*MUSD.*?Δ15m:\s*(?P<d15>[+\-][0-9.]+).*?Δ1d:\s*(?P<d1d>[+\-][0-9.]+)',re.ASCII)
-    sectors=[]
-    for i,l in enumerate(lines):
-        m=SECTOR_LINE_RE.search(l)
-        if not m: continue
-        sectors.append({
-            "name":m.group("name").strip(),
-            "energy":float(m.group("energy").replace(',','')),
-            "d15":float(m.group("d15")),
-            "d1d":float(m.group("d1d")),
-            "line":i
-        })
-    print("===== DEBUG: parsed sectors =====")
-    for s in sectors: print(s)
-    print("===== DEBUG END =====")
+    sectors=report["sectors"]
+    if not sectors:
+        return f"{tstr} 현재 집계된 섹터 자금 흐름이 없습니다."
     top15=max(sectors,key=lambda x:x["d15"],default=None)
     top1d_in=max(sectors,key=lambda x:x["d1d"],default=None)
     top1d_out=min(sectors,key=lambda x:x["d1d"],default=None)
-    leader=None
-    for l in lines:
-        if "energy=" in l:
-            leader=l.strip().split()[0]
-            break
+    leader=next((s["leaders"][0]["code"] for s in sectors if s["leaders"]),None)
     def scale(v):
-        return f"{v/1000:.1f} 빌리언달러" if abs(v)>=1000 else f"{abs(v):.0f} 밀리언달러"
-    print("===== DEBUG: voice summary picks =====")
-    print("top15=",top15)
-    print("top1d_in=",top1d_in)
-    print("top1d_out=",top1d_out)
-    print("leader=",leader)
-    print("===== DEBUG END =====")
+        return f"{abs(v)/1000:.1f} 빌리언달러" if abs(v)>=1000 else f"{abs(v):.0f} 밀리언달러"
     summary=(
-        f"{tstr} 현재 {top15['name']} 섹터에 약 {scale(top15['d15'])}가 최근 15분 동안 가장 강하게 들어왔습니다. "
-        f"오늘은 {top1d_in['name']} 섹터로 약 {scale(top1d_in['d1d'])} 들어오고, "
-        f"{top1d_out['name']} 섹터에서는 약 {scale(top1d_out['d1d'])} 빠져나가고 있습니다. "
-        f"현재 주도주는 {leader} 입니다."
+        f"{tstr} 현재 {top15['sector']} 섹터에 약 {scale(top15['d15'])}가 최근 15분 동안 가장 강하게 들어왔습니다. "
+        f"오늘은 {top1d_in['sector']} 섹터로 약 {scale(top1d_in['d1d'])} 들어오고, "
+        f"{top1d_out['sector']} 섹터에서는 약 {scale(top1d_out['d1d'])} 빠져나가고 있습니다. "
+        +(f"현재 주도주는 {leader} 입니다." if leader else "")
     )
-    print("===== DEBUG: final voice briefing =====")
-    print(summary)
-    print("===== DEBUG END =====")
-    return summary
+    return summary.rstrip()
 
 # ----------------------------------------------------------
-# ② mp3 생성 (gTTS 사용)
+# ② mp3 생성 (gTTS, 문장 단위 캐시 — wk_tts)
 # ----------------------------------------------------------
 def make_mp3(text: str, out_path = "briefing.mp3"):
-    from gtts import gTTS
-    tts = gTTS(text, lang = "ko")
-    tts.save(out_path)
-    return out_path
+    path, made, reused = wk_tts.synth(text, out_path, lang = "ko")
+    print(f"🔊 TTS: 새로 합성 {made} / 캐시 {reused}")
+    return path
 
 # ----------------------------------------------------------
-# ③ 브리핑 전체 생성 + 전송
+# ③ 브리핑 전체 생성 + 전송 (sector_weather 를 같은 프로세스에서)
 # ----------------------------------------------------------
 def main():
-    os.system(f"python3 sector_weather.py > {BRIEF}")
+    b = sector_weather.briefing()
 
-    if not os.path.exists(BRIEF):
-        send_text("❗ 섹터 브리핑 파일이 생성되지 않았습니다.")
+    # 로그/briefing.txt 는 기존처럼 컬러, 텔레그램은 ANSI 없이
+    text = sector_weather.render_briefing(b)
+    print(text)
+    with open(BRIEF, "w", encoding = "utf-8") as f:
+        f.write(text + "\n")
+    if not b["reports"]:
+        send_text("❗ 섹터 브리핑을 만들 캐시가 없습니다.")
         return
 
-    msg = open(BRIEF, "r", encoding = "utf-8").read()
+    msg = sector_weather.render_briefing(b, color = False)
 
-    MAX = 3800
-    if len(msg) <= MAX:
-        send_text(msg)
-    else:
-        for i in range(0, len(msg), MAX):
-            send_text(msg[i:i+MAX])
+    # 음성 합성은 텍스트를 보내는 동안 옆에서
+    summary = make_voice_summary(b["reports"][0])
+    with ThreadPoolExecutor(max_workers = 1) as ex:
+        mp3 = ex.submit(make_mp3, summary)
 
-    summary = make_voice_summary(msg)
-    mp3_path = make_mp3(summary)
-    send_voice(mp3_path)
+        MAX = 3800
+        if len(msg) <= MAX:
+            send_text(msg)
+        else:
+            for i in range(0, len(msg), MAX):
+                send_text(msg[i:i+MAX])
+
+        send_voice(mp3.result())
+    sector_weather.finish()
 
 if __name__ == "__main__":
     main()
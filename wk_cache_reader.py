@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# 캐시 읽기 공용 모듈
+#   get_market("kr", "15m")          → {key: SymbolItem}  (버킷 전체)
+#   get_symbol("us", "1d", "NVDA")   → SymbolItem | None  (샤드 manifest 가 있으면 그 파일 하나만)
+#   tail(bucket_or_item, n)          → 마지막 n 봉만 남긴 사본
+#   파싱한 버킷은 프로세스 안 LRU 에 두고, 파일 mtime/size 가 바뀌면 다시 읽는다.
+#   profile/price_set 은 버킷에 담지 않고 처음 꺼낼 때 샤드(없으면 버킷 JSON)에서 읽는다.
+#   버킷 JSON 을 읽을 때도 wkjson 레이아웃의 profile/price_set 줄은 파싱 전에 걸러 낸다.
+import os, re, json, threading
+from collections import OrderedDict
+from wk_columnar import BAR_COLS, columnar_path, load_columnar, cache_format
+from wk_shards import load_manifest, load_shard
+
+CACHE_DIR = os.path.join(os.getcwd(), "cache")
+LAZY_FIELDS = ("profile", "price_set")
+LRU_SIZE = int(os.environ.get("WK_READER_LRU", "8") or 8)
+# wkjson 은 profile(숫자 key 평면 객체)·price_set(숫자 배열)을 item 안 한 줄씩에 쓴다
+_LAZY_LINES = re.compile(r'^, "profile": \{[^{}\n]*\}\n|^, "price_set": \[[^\[\]\n]*\]\n', re.M)
+
+_lru = OrderedDict()
+_lock = threading.Lock()
+
+def bucket_path(market, interval, cache_dir = None):
+    return os.path.join(cache_dir or CACHE_DIR, f"all_{market}_{interval}.json")
+
+def _stamp(path):
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+class SymbolItem(dict):
+    """버킷 item (dict) — profile/price_set 은 처음 꺼낼 때 읽어 채운다"""
+    __slots__ = ("_lazy",)
+    def __init__(self, data = (), lazy = None):
+        super().__init__(data)
+        self._lazy = lazy
+    def __missing__(self, key):
+        if key in LAZY_FIELDS and self._lazy is not None:
+            full = self._lazy() or {}
+            self._lazy = None
+            for k in LAZY_FIELDS:
+                if k in full: dict.__setitem__(self, k, full[k])
+            if dict.__contains__(self, key):
+                return dict.__getitem__(self, key)
+        raise KeyError(key)
+    def get(self, key, default = None):
+        try: return self[key]
+        except KeyError: return default
+    def __contains__(self, key):
+        # 아직 안 읽은 profile/price_set 도 get() 과 같은 답 (keys()/items() 에는 읽은 뒤에만 나온다)
+        if dict.__contains__(self, key): return True
+        return key in LAZY_FIELDS and self.get(key) is not None
+
+class _LazySource:
+    """load_path 한 번에 하나 — 종목들이 profile/price_set 을 꺼낼 때 함께 쓰는 원천.
+    manifest 는 한 번만 읽고, 샤드가 없으면 버킷 JSON 을 한 번만 파싱해 전 종목 몫을 들고 있는다"""
+    def __init__(self, path, market, interval, cache_dir):
+        self.path = path; self.market = market; self.interval = interval; self.cache_dir = cache_dir
+        self.man = None; self.full = None
+        self.lock = threading.Lock()
+
+    def _bucket(self):
+        if self.full is None:
+            try:
+                with open(self.path, "r", encoding = "utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = {}
+            self.full = {k: {f: it[f] for f in LAZY_FIELDS if f in it} for k, it in data.items()}
+        return self.full
+
+    def load(self, key):
+        with self.lock:
+            if self.market and self.man is None:
+                self.man = load_manifest(self.cache_dir, self.market, self.interval)
+            it = load_shard(self.cache_dir, self.market, self.interval, key, self.man) if self.man else None
+            return it if it is not None else self._bucket().get(key)
+
+    def loader(self, key):
+        return lambda: self.load(key)
+
+def _trim(it, columns):
+    """JSON item → 요청한 봉 컬럼만 (energy 는 energies + energy_stats), profile/price_set 제외"""
+    out = {k: v for k, v in it.items() if k not in LAZY_FIELDS and k not in ("ohlcv", "energies", "energy_stats")}
+    cols = BAR_COLS if columns is None else columns
+    o = it.get("ohlcv") or {}
+    out["ohlcv"] = {c: o[c] for c in BAR_COLS[:-1] if c in cols and c in o}
+    if "energy" in cols:
+        for k in ("energies", "energy_stats"):
+            if k in it: out[k] = it[k]
+    return out
+
+def load_path(path, columns = None, market = None, interval = None, cache_dir = None):
+    """버킷 파일 → {key: SymbolItem} (LRU, mtime/size 로 무효화). 없으면 {}
+    columns: 봉 컬럼 (ts/open/high/low/close/volume/energy, 기본 전부)"""
+    cache_dir = cache_dir or os.path.dirname(path)
+    cols = None if columns is None else tuple(c for c in columns if c in BAR_COLS)
+    pq = columnar_path(path)
+    use_pq = cache_format() == "parquet" and os.path.exists(pq)
+    src = pq if use_pq else path
+    try:
+        stamp = _stamp(src)
+    except OSError:
+        return {}
+    key = (src, cols)
+    with _lock:
+        hit = _lru.get(key)
+        if hit and hit[0] == stamp:
+            _lru.move_to_end(key)
+            return hit[1]
+    raw = None
+    if use_pq:
+        try: raw = load_columnar(pq, cols)
+        except ImportError: src = path; stamp = _stamp(path)
+    if raw is None:
+        with open(path, "r", encoding = "utf-8") as f:
+            raw = {k: _trim(it, cols) for k, it in json.loads(_LAZY_LINES.sub("", f.read())).items()}
+    lazy = _LazySource(path, market, interval, cache_dir)
+    data = {k: SymbolItem(it, lazy.loader(k)) for k, it in raw.items()}
+    with _lock:
+        _lru[(src, cols)] = (stamp, data)
+        _lru.move_to_end((src, cols))
+        while len(_lru) > LRU_SIZE:
+            _lru.popitem(last = False)
+    return data
+
+def get_market(market, interval = "15m", columns = None, cache_dir = None):
+    """시장 버킷 전체 → {key: SymbolItem} (파일 없으면 {})"""
+    cache_dir = cache_dir or CACHE_DIR
+    return load_path(bucket_path(market, interval, cache_dir), columns, market, interval, cache_dir)
+
+def get_symbol(market, interval, key, columns = None, cache_dir = None):
+    """한 종목 → SymbolItem | None. 샤드가 있으면 그 파일 하나만 읽는다"""
+    cache_dir = cache_dir or CACHE_DIR
+    if load_manifest(cache_dir, market, interval):
+        it = load_shard(cache_dir, market, interval, key)
+        return SymbolItem(it) if it is not None else None
+    return get_market(market, interval, columns, cache_dir).get(key)
+
+def tail(data, n):
+    """item 이면 마지막 n 봉만 남긴 사본, 버킷이면 종목마다 그렇게"""
+    if "ohlcv" not in data and all(isinstance(v, dict) for v in data.values()):
+        return {k: tail(it, n) for k, it in data.items()}
+    out = SymbolItem({k: v for k, v in dict.items(data)}, getattr(data, "_lazy", None))
+    cut = lambda v: list(v[max(0, len(v) - n):])
+    out["ohlcv"] = {c: cut(v) for c, v in (data.get("ohlcv") or {}).items()}
+    if "energies" in out:
+        out["energies"] = cut(out["energies"])
+    if "rows" in out:
+        out["rows"] = min(int(out["rows"] or 0), n)
+    return out
+
+def clear():
+    with _lock:
+        _lru.clear()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# 캐시 버킷 ↔ 컬럼형(Parquet) 스냅샷
+#   cache/all_{kr,us,ix}_{iv}.json 과 같은 자리에 all_*_{iv}.parquet 를 함께 쓴다.
+#   한 행 = 한 종목의 한 봉, OHLCV 는 int64/float64 타입 컬럼, 종목 메타는 dictionary 인코딩.
+#   energy_stats 는 JSON 문자열 그대로 dictionary 컬럼, profile/price_set 은 JSON 에만 있다.
+import os, json
+import numpy as np
+
+META_COLS = ("key", "name", "symbol", "interval", "last_bar_start", "last_bar_end")
+BAR_COLS  = ("ts", "open", "high", "low", "close", "volume", "energy")
+ROW_GROUP = 1024   # 종목 단위로 묶여 정렬돼 있어 key 필터가 row group 통계로 걸러진다
+
+def columnar_path(json_path):
+    return os.path.splitext(json_path)[0] + ".parquet"
+
+def _schema():
+    import pyarrow as pa
+    d = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ("key", pa.string()), ("order", pa.int32()),
+        ("name", d), ("symbol", d), ("interval", d),
+        ("last_bar_start", d), ("last_bar_end", d),
+        ("ts", pa.int64()), ("open", pa.float64()), ("high", pa.float64()),
+        ("low", pa.float64()), ("close", pa.float64()), ("volume", pa.int64()),
+        ("energy", pa.float64()), ("energy_stats", d),
+    ])
+
+def bucket_to_table(bucket):
+    """{key: item} → pyarrow.Table (key 오름차순, 원래 버킷 순서는 order 컬럼)"""
+    import pyarrow as pa
+    cols = {c: [] for c in _schema().names}
+    for pos, key in sorted(enumerate(bucket), key = lambda x: x[1]):
+        it = bucket[key]; o = it.get("ohlcv") or {}
+        n = len(o.get("ts") or [])
+        if not n: continue
+        cols["key"] += [key] * n; cols["order"] += [pos] * n
+        for c in META_COLS[1:]:
+            cols[c] += [str(it.get(c) or "")] * n
+        for c in BAR_COLS[:-1]:
+            cols[c] += list(o[c])
+        en = list(it.get("energies") or [])
+        cols["energy"] += (en + [None] * n)[:n]
+        es = it.get("energy_stats")
+        cols["energy_stats"] += [json.dumps(es, separators = (",", ":")) if es is not None else None] * n
+    return pa.Table.from_pydict(cols, schema = _schema())
+
+def save_columnar(path, bucket):
+    import pyarrow.parquet as pq
+    os.makedirs(os.path.dirname(path) or ".", exist_ok = True)
+    tmp = path + ".tmp"
+    pq.write_table(bucket_to_table(bucket), tmp, row_group_size = ROW_GROUP, compression = "zstd")
+    os.replace(tmp, path)
+
+def load_columnar(path, columns = None, symbols = None, arrays = False):
+    """Parquet 스냅샷 → JSON 버킷과 같은 모양의 {key: item} (profile/price_set 없음)
+    columns: 읽을 봉 컬럼 (ts/open/high/low/close/volume/energy, 기본 전부)
+    symbols: 읽을 key 목록 (기본 전부) — row group 통계로 필요한 구간만 읽는다
+    arrays : True 면 ohlcv/energies 를 list 대신 numpy 배열로"""
+    import pyarrow.parquet as pq
+    bars = [c for c in (columns or BAR_COLS) if c in BAR_COLS]
+    filters = [("key", "in", list(symbols))] if symbols is not None else None
+    stats = "energy" in bars and "energy_stats" in pq.read_schema(path).names   # 예전 스냅샷엔 없다
+    t = pq.read_table(path, columns = ["key", "order", *META_COLS[1:], *bars] + ["energy_stats"] * stats, filters = filters)
+    if t.num_rows == 0:
+        return {}
+    keys = t.column("key").to_numpy(zero_copy_only = False)
+    # key 로 정렬돼 있으므로 경계만 찾으면 종목별 구간
+    cut = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+    starts = np.r_[0, cut]; ends = np.r_[cut, len(keys)]
+    order = t.column("order").to_numpy()[starts]
+    meta = {c: t.column(c).take(starts).to_pylist() for c in META_COLS[1:] + ("energy_stats",) * stats}
+    data = {c: t.column(c).to_numpy(zero_copy_only = False) for c in bars}
+    if not arrays:
+        data = {c: v.tolist() for c, v in data.items()}
+    out = []
+    for i, (s, e) in enumerate(zip(starts, ends)):
+        it = {c: meta[c][i] for c in META_COLS[1:]}
+        if stats and meta["energy_stats"][i] is not None:
+            it["energy_stats"] = json.loads(meta["energy_stats"][i])
+        it["rows"] = int(e - s)
+        seg = {c: data[c][s:e] for c in bars}
+        en = seg.pop("energy", None)
+        it["ohlcv"] = seg
+        if en is not None:
+            it["energies"] = en
+        out.append((int(order[i]), keys[s], it))
+    out.sort(key = lambda x: x[0])
+    return {k: it for _, k, it in out}
+
+#────────────────────────────────────────
+# 소비자용: WK_CACHE_FORMAT=parquet 이고 옆에 .parquet 가 있으면 컬럼형, 아니면 JSON
+#────────────────────────────────────────
+def cache_format():
+    return (os.environ.get("WK_CACHE_FORMAT") or "json").lower()
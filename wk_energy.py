@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# 에너지 엔진 (에너지 = close × volume × 1e-6, MUSD)
+#   봉 축은 항상 마지막 축 — 종목 하나 (T,) 든 패널 (N, T) 든 같은 함수로 한 번에.
+#   energy_stats() 가 캐시 item 의 "energy_stats" 로 들어간다 (마지막 봉 기준 요약):
+#     ema   : 에너지 EMA (span = WIN[iv])
+#     mean/std/z : 직전 WIN 봉의 평균·표준편차와 마지막 봉의 z-score
+#     surge : 마지막 봉 / 직전 WIN 봉 중앙값
+#     tod   : 분봉만 — 마지막 봉 / 직전 TOD_DAYS 일 같은 시각 봉들의 중앙값 (장 초반·막판 쏠림 보정)
+import warnings
+import numpy as np
+import pandas as pd
+from wk_session import SESSIONS
+
+WIN = {"1m": 60, "15m": 26, "1d": 20, "1wk": 13}   # 15m 26봉 = 미장 정규장 하루
+TOD_DAYS = 7   # 달력일 (주말 포함 약 5 세션)
+STATS_KEYS = ("ema", "mean", "std", "z", "surge", "tod")
+
+def energy(close, volume):
+    return np.round(np.asarray(close, dtype = "float64") * np.asarray(volume, dtype = "float64") * 1e-6, 3)
+
+def ema(e, span):
+    """NaN 은 건너뛰고 직전 값을 잇는 EMA (adjust=False)"""
+    e = np.asarray(e, dtype = "float64")
+    a = 2.0 / (span + 1)
+    out = np.full(e.shape, np.nan)
+    y = np.full(e.shape[:-1], np.nan)
+    for t in range(e.shape[-1]):
+        x = e[..., t]
+        y = np.where(np.isnan(y), x, np.where(np.isnan(x), y, y + a * (x - y)))
+        out[..., t] = y
+    return out
+
+def _nanquiet(f, *a, **kw):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return f(*a, **kw)
+
+def trailing(e, win):
+    """봉마다 직전 win 봉(자기 제외)의 (mean, std, median) — 유효 봉이 win/2 미만이면 NaN"""
+    e = np.asarray(e, dtype = "float64")
+    pad = np.concatenate([np.full(e.shape[:-1] + (win,), np.nan), e[..., :-1]], axis = -1)
+    w = np.lib.stride_tricks.sliding_window_view(pad, win, axis = -1)
+    few = (~np.isnan(w)).sum(axis = -1) < max(2, win // 2)
+    mean = np.where(few, np.nan, _nanquiet(np.nanmean, w, axis = -1))
+    std = np.where(few, np.nan, _nanquiet(np.nanstd, w, axis = -1))
+    med = np.where(few, np.nan, _nanquiet(np.nanmedian, w, axis = -1))
+    return mean, std, med
+
+def _local(ts, market):
+    """ts(ms, UTC) → (현지 분, 현지 날짜 일수). 빈 칸(ts<0)은 -1"""
+    ts = np.asarray(ts, dtype = "int64")
+    ok = ts >= 0
+    idx = pd.to_datetime(np.where(ok, ts, 0).ravel(), unit = "ms", utc = True).tz_convert(SESSIONS[market]["tz"])
+    minute = (idx.hour * 60 + idx.minute).to_numpy().reshape(ts.shape)
+    day = idx.tz_localize(None).to_numpy().astype("datetime64[D]").astype("int64").reshape(ts.shape)
+    return np.where(ok, minute, -1), np.where(ok, day, -1)
+
+def tod_ratio(ts, e, market, days = TOD_DAYS):
+    """봉마다 에너지 / 직전 days 일 같은 현지 시각 봉들의 중앙값 (기준 봉이 없으면 NaN)"""
+    e = np.asarray(e, dtype = "float64")
+    minute, day = _local(ts, market)
+    # (…, T, T) — [i, j]: j 가 i 와 같은 시각이고 i 보다 앞선 days 일 안의 봉
+    same = (minute[..., :, None] == minute[..., None, :]) & (minute[..., :, None] >= 0)
+    dd = day[..., :, None] - day[..., None, :]
+    ref = np.where(same & (dd > 0) & (dd <= days), e[..., None, :], np.nan)
+    med = _nanquiet(np.nanmedian, ref, axis = -1) if ref.size else np.full(e.shape, np.nan)
+    return _nanquiet(np.divide, e, med)
+
+def _r(x):
+    x = float(x)
+    return round(x, 3) if np.isfinite(x) else None
+
+def stats_arrays(ts, e, interval, market = None):
+    """마지막 봉 기준 {ema, mean, std, z, surge, tod} 배열 (…,) — 패널이면 종목별"""
+    e = np.asarray(e, dtype = "float64")
+    win = WIN.get(interval, 20)
+    mean, std, med = (a[..., -1] for a in trailing(e, win))
+    last = e[..., -1]
+    out = {"ema": ema(e, win)[..., -1], "mean": mean, "std": std,
+           "z": _nanquiet(np.divide, last - mean, np.where(std > 0, std, np.nan)),
+           "surge": _nanquiet(np.divide, last, np.where(med > 0, med, np.nan))}
+    if interval.endswith("m") and market in SESSIONS and e.shape[-1]:
+        out["tod"] = tod_ratio(ts, e, market)[..., -1]
+    else:
+        out["tod"] = np.full(last.shape, np.nan)
+    return out
+
+def energy_stats(ts, e, interval, market = None):
+    """종목 하나 → {"ema", "mean", "std", "z", "surge", "tod"} (값 없으면 None)"""
+    if not len(e):
+        return dict.fromkeys(STATS_KEYS)
+    s = stats_arrays(ts, e, interval, market)
+    return {k: _r(s[k]) for k in STATS_KEYS}
@@ -1,58 +1,293 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-import os, re, json, time, datetime, requests
+import os, io, re, sys, json, time, random, hashlib, datetime, threading, requests
+from json.encoder import encode_basestring as _enc_str
+from concurrent.futures import Future, ThreadPoolExecutor
 import pandas as pd
 import numpy as np
-from bs4 import BeautifulSoup
+import lxml.html
 import yfinance as yf
+from wk_session import SESSIONS, market_of, bar_offset, is_open, last_close
+from wk_columnar import columnar_path, save_columnar
+from wk_shards import save_shards, manifest_path
+from wk_registry import SymbolRegistry
+from wk_rank import rank_path, save_rank
+from wk_energy import energy, energy_stats
 CACHE_DIR = os.path.join(os.getcwd(), "cache")
 os.makedirs(CACHE_DIR, exist_ok = True)
+# ============================================================
+# wkjson: 줄 단위 레이아웃 JSON 을 파일 핸들로 바로 흘려 쓴다
+#   json.dumps(separators=(', ', ': ')) 결과에
+#   1) 숫자/음수로 시작하지 않는 문자열 앞의 '{' / ', ' 를 '\n{ ' / '\n, ' 로,
+#   2) 그 중 '}' 바로 뒤에서 "값이 (숫자 아닌 key 로 시작하는) 객체인 key" 가 오면 '\n},' 로
+#   바꾼 것과 바이트 단위로 같다 (정규식 후처리 없이 토큰 단위로 결정).
+# ============================================================
+_WK_SEP = (", ", ": ")
+_WK_NUM0 = "0123456789-"
+
+def _wk_scalar(x):
+    if isinstance(x, str): return _enc_str(x)
+    if x is None: return "null"
+    if x is True: return "true"
+    if x is False: return "false"
+    if isinstance(x, int): return int.__repr__(x)
+    if isinstance(x, float):
+        if x != x: return "NaN"
+        if x == float("inf"): return "Infinity"
+        if x == -float("inf"): return "-Infinity"
+        return float.__repr__(x)
+    raise TypeError(f"Object of type {type(x).__name__} is not JSON serializable")
+
+def _wk_key(k):
+    if isinstance(k, str): return _enc_str(k)
+    if k is None or isinstance(k, (bool, int, float)): return '"' + _wk_scalar(k) + '"'
+    raise TypeError(f"keys must be str, int, float, bool or None, not {type(k).__name__}")
+
+def _wk_breaks(enc):
+    # 1) 줄바꿈 대상: 따옴표 다음 첫 글자가 숫자/음수 부호가 아닌 문자열
+    return enc[1] not in _WK_NUM0
+
+class _WkJsonWriter:
+    def __init__(self, write):
+        self.write = write
+        self.pend = False   # 객체 닫는 '}' 보류 (2) 규칙에서 '\n}' 로 바뀔 수 있음)
+    def put(self, s):
+        if self.pend:
+            self.pend = False; self.write("}")
+        self.write(s)
+    def value(self, x):
+        if isinstance(x, dict): self.obj(x)
+        elif isinstance(x, (list, tuple)): self.arr(x)
+        else: self.put(_wk_scalar(x))
+    def arr(self, a):
+        if not any(isinstance(x, (str, dict, list, tuple)) for x in a):
+            # 숫자 배열(ohlcv/energies/price_set)은 줄바꿈 대상이 없어 C 인코더로 한 번에
+            self.put(json.dumps(a, ensure_ascii = False, separators = _WK_SEP)); return
+        self.put("[")
+        for i, x in enumerate(a):
+            if i: self.put("\n, " if isinstance(x, str) and _wk_breaks(_enc_str(x)) else ", ")
+            self.value(x)
+        self.put("]")
+    def obj(self, d):
+        keys = [_wk_key(k) for k in d]
+        if not any(map(_wk_breaks, keys)) and not any(isinstance(v, (dict, list, tuple)) for v in d.values()):
+            # 숫자 key + 스칼라 값(profile) → 줄바꿈 대상 없음
+            self.put(json.dumps(d, ensure_ascii = False, separators = _WK_SEP)[:-1])
+            self.pend = True; return
+        for i, (ek, v) in enumerate(zip(keys, d.values())):
+            if i == 0:
+                self.put("\n{ " + ek if _wk_breaks(ek) else "{" + ek)
+            elif not _wk_breaks(ek):
+                self.put(", " + ek)
+            elif self.pend and len(ek) > 2 and '"' not in ek[1:-1] and isinstance(v, dict) and v and _wk_breaks(_wk_key(next(iter(v)))):
+                # 2) 직전 값이 객체이고 이 key 의 값도 객체 → '\n},"key"'
+                self.pend = False; self.write("\n}," + ek)
+            else:
+                self.put("\n, " + ek)
+            self.put(": ")
+            self.value(v)
+        self.put("")
+        self.pend = True
+
+def wkjson_dump(obj, fp):
+    w = _WkJsonWriter(fp.write)
+    w.value(obj)
+    w.put("")
+
 def wkjson_dumps(obj):
-    import json, re
-    s = json.dumps(obj, ensure_ascii=False, separators=(', ', ': '), indent=None)
-    # 1) 객체 새 key 시작: 숫자/음수 key 제외하고 줄바꿈
-    s = re.sub(r'(,|{)\s*"(?=[^0-9-])', r'\n\1 "', s)
-    # 2) 직전이 객체 닫기('}')이고, 다음 key가 객체 여는 key(": {")일 때만 줄바꿈 조정
-    s = re.sub(r'\}\n, "(?=[^0-9-][^"]*"\s*:\s*\{\s*"[^0-9-])', r'\n},"', s)
-    return s
+    buf = io.StringIO()
+    wkjson_dump(obj, buf)
+    return buf.getvalue()
+
 def _log(msg): print(msg, flush = True)
+def _log_json(obj):
+    wkjson_dump(obj, sys.stdout)
+    print(flush = True)
+class _HashingWriter:
+    """utf-8 로 쓰면서 sha1 을 같이 계산"""
+    def __init__(self, f):
+        self.f = f; self.h = hashlib.sha1()
+    def write(self, s):
+        b = s.encode("utf-8")
+        self.h.update(b); self.f.write(b)
+
+def _file_sha1(path):
+    h = hashlib.sha1()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+    except OSError:
+        return None
+    return h.hexdigest()
+
 def _save_json(path, obj):
+    """임시 파일에 쓰면서 해시 → 기존 파일과 같으면 그대로 두고 False, 바뀌었으면 교체하고 True"""
     os.makedirs(os.path.dirname(path), exist_ok = True)
-    with open(path, "w", encoding = "utf-8") as f:
-        f.write(wkjson_dumps(obj))
-def get_top_kr(limit = 33, retry = 0):
-    url = "https://finance.naver.com/sise/sise_quant.naver"
-    headers = {"User-Agent": "Mozilla/5.0", "Accept-Language": "ko-KR,en;q=0.8"}
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        w = _HashingWriter(f)
+        wkjson_dump(obj, w)
+    if w.h.hexdigest() == _file_sha1(path):
+        os.remove(tmp)
+        return False
+    os.replace(tmp, path)
+    return True
+
+# JSON 옆에 컬럼형(Parquet) 스냅샷(WK_FEED_COLUMNAR=0 이면 생략), 순위 인덱스(rank_{mk}_{iv}.json),
+# 종목별 샤드 + manifest(cache/{mk}/{iv}/, WK_FEED_SHARDS=0 이면 생략)도 함께 저장
+COLUMNAR = os.environ.get("WK_FEED_COLUMNAR", "1") not in ("", "0")
+SHARDS = os.environ.get("WK_FEED_SHARDS", "1") not in ("", "0")
+def _bucket_path(mk, iv):
+    return os.path.join(CACHE_DIR, f"all_{mk}_{iv}.json")
+def _save_bucket(mk, iv, bucket):
+    """버킷 저장 → 내용이 바뀌었으면 True. 그대로면 Parquet/순위/샤드도 (이미 있으면) 건드리지 않는다"""
+    path = _bucket_path(mk, iv)
+    changed = _save_json(path, bucket)
+    if COLUMNAR and (changed or not os.path.exists(columnar_path(path))):
+        try:
+            save_columnar(columnar_path(path), bucket)
+        except ImportError:
+            _log("⚠️ pyarrow 없음 → 컬럼형 스냅샷 생략")
+        except Exception as e:
+            _log(f"⚠️ 컬럼형 스냅샷 저장 실패: {path}: {e!r}")
+    if changed or not os.path.exists(rank_path(path)):
+        try:
+            save_rank(path, bucket, mk, iv)
+        except Exception as e:
+            _log(f"⚠️ 순위 인덱스 저장 실패: {path}: {e!r}")
+    if SHARDS and (changed or not os.path.exists(manifest_path(CACHE_DIR, mk, iv))):
+        try:
+            n = save_shards(CACHE_DIR, mk, iv, bucket, wkjson_dumps)
+            _log(f"🗂 {mk}/{iv} 샤드 {n}/{len(bucket)}개 갱신")
+        except Exception as e:
+            _log(f"⚠️ 종목별 샤드 저장 실패: {mk}/{iv}: {e!r}")
+    return changed
+
+def _report_changed(changed, total, extra = False):
+    """바뀐 버킷 목록을 로그와 $GITHUB_OUTPUT(changed=kr_1m,us_1m …)으로 알림
+    extra: 버킷 말고 바뀐 파일(스케줄 상태 등)이 있으면 True → changed_any 에 반영"""
+    _log(f"📝 변경 버킷 {len(changed)}/{total}: {', '.join(changed) or '없음'}")
+    out = os.environ.get("GITHUB_OUTPUT")
+    if not out:
+        return
     try:
-        r = requests.get(url, headers = headers, timeout = 5)
-        r.raise_for_status()
-        soup = BeautifulSoup(r.text, "lxml")
-        table = soup.select_one("table.type_2")
-        if not table:
-            raise ValueError("table missing")
-        out = []
-        for row in table.select("tr"):
-            a = row.select_one("a.tltle")
-            tds = [td.text.replace(",", "").replace("%", "").strip() for td in row.select("td")]
-            if not a or len(tds) < 7:
-                continue
-            name = a.text.strip()
-            href = a.get("href", "")
-            if "code=" not in href:
-                continue
-            code = "A" + href.split("code=")[-1][:6]
-            try: pct = float(tds[2])
-            except: pct = 0.0
-            try: val = float(tds[6]) / 100.0
-            except: val = 0.0
-            out.append((name, code, pct, val))
-        out.sort(key = lambda x: x[3], reverse = True)
-        return out[:limit]
-    except Exception:
-        if retry < 2:
-            time.sleep(3)
-            return get_top_kr(limit, retry + 1)
-        return []
+        with open(out, "a", encoding = "utf-8") as f:
+            f.write(f"changed={','.join(changed)}\n")
+            f.write(f"changed_any={'true' if changed or extra else 'false'}\n")
+    except OSError as e:
+        _log(f"⚠️ GITHUB_OUTPUT 기록 실패: {e!r}")
+
+# ============================================================
+# 업스트림별 요청 제한 (토큰 버킷)
+# ============================================================
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = float(rate); self.burst = max(1.0, float(burst))
+        self.tokens = self.burst; self.stamp = time.monotonic()
+        self.lock = threading.Lock()
+    def acquire(self, n = 1):
+        n = min(float(n), self.burst)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+                self.stamp = now
+                if self.tokens >= n:
+                    self.tokens -= n
+                    return
+                wait = (n - self.tokens) / self.rate
+            time.sleep(wait)
+
+def _env_float(name, default):
+    try: return float(os.environ.get(name) or default)
+    except: return float(default)
+
+# 초당 요청 수 / 버스트 (WK_RATE_YAHOO, WK_RATE_NAVER 로 조정)
+RATE_LIMITS = {
+    "yahoo": TokenBucket(_env_float("WK_RATE_YAHOO", 8), 40),
+    "naver": TokenBucket(_env_float("WK_RATE_NAVER", 2), 2),
+}
+def _throttle(src, n = 1):
+    RATE_LIMITS[src].acquire(n)
+
+# ============================================================
+# 실행기: 스레드 풀 / 직렬(디버그)
+# ============================================================
+FEED_WORKERS = int(_env_float("WK_FEED_WORKERS", 8))
+if os.environ.get("WK_FEED_SERIAL", "") not in ("", "0"):
+    FEED_WORKERS = 1
+
+class _SerialExecutor:
+    """ThreadPoolExecutor 와 같은 submit() 을 호출 즉시 순서대로 실행"""
+    def submit(self, fn, *a, **kw):
+        f = Future()
+        try: f.set_result(fn(*a, **kw))
+        except BaseException as e: f.set_exception(e)
+        return f
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+
+def _executor(workers):
+    return ThreadPoolExecutor(max_workers = workers, thread_name_prefix = "feed") if workers > 1 else _SerialExecutor()
+
+# 네이버 등 직접 부르는 HTTP 는 연결을 재사용 (데몬에서는 프로세스 수명 내내 유지)
+_HTTP = requests.Session()
+
+# 네이버 거래량 상위: 코스피(sosok=0)·코스닥(sosok=1) 두 보드를 한 세션으로 동시에
+NAVER_QUANT_URL = "https://finance.naver.com/sise/sise_quant.naver"
+NAVER_BOARDS = {"0": "KS", "1": "KQ"}   # sosok → 야후 접미사
+NAVER_RETRIES = 3
+
+def _naver_board(sosok):
+    """보드 한 장 → [(name, code, pct, val)]; 실패하면 지터 섞은 지수 백오프로 NAVER_RETRIES 번까지"""
+    headers = {"User-Agent": "Mozilla/5.0", "Accept-Language": "ko-KR,en;q=0.8"}
+    for attempt in range(NAVER_RETRIES):
+        try:
+            _throttle("naver")
+            r = _HTTP.get(NAVER_QUANT_URL, params = {"sosok": sosok}, headers = headers, timeout = 5)
+            r.raise_for_status()
+            return _parse_naver_quant(r.content)
+        except Exception as e:
+            if attempt + 1 >= NAVER_RETRIES:
+                _log(f"⚠️ 네이버 sosok={sosok} 수신 실패: {e!r}")
+                return []
+            time.sleep(min(8.0, 2 ** attempt) * (0.5 + random.random()))
+
+def _parse_naver_quant(content):
+    root = lxml.html.fromstring(content.decode("euc-kr", "replace"))
+    table = root.xpath('//table[contains(concat(" ", normalize-space(@class), " "), " type_2 ")]')
+    if not table:
+        raise ValueError("table missing")
+    out = []
+    for row in table[0].iter("tr"):
+        a = row.xpath('.//a[contains(concat(" ", normalize-space(@class), " "), " tltle ")]')
+        tds = [td.text_content().replace(",", "").replace("%", "").strip() for td in row.iterfind("td")]
+        if not a or len(tds) < 7:
+            continue
+        href = a[0].get("href", "")
+        if "code=" not in href:
+            continue
+        code = "A" + href.split("code=")[-1][:6]
+        try: pct = float(tds[2])
+        except: pct = 0.0
+        try: val = float(tds[6]) / 100.0
+        except: val = 0.0
+        out.append((a[0].text_content().strip(), code, pct, val))
+    return out
+
+def get_top_kr(limit = 33):
+    """→ [(name, code, pct, val, exchange)] 거래대금 내림차순 (exchange: 나온 보드의 "KS" | "KQ")"""
+    futs = {}
+    with _executor(min(FEED_WORKERS, len(NAVER_BOARDS))) as ex:
+        for sosok in NAVER_BOARDS:
+            futs[sosok] = ex.submit(_naver_board, sosok)
+    out = {}
+    for sosok, f in futs.items():
+        for name, code, pct, val in f.result():
+            out.setdefault(code, (name, code, pct, val, NAVER_BOARDS[sosok]))
+    out = sorted(out.values(), key = lambda x: x[3], reverse = True)
+    return out[:limit]
 BASE_US = [
     "SPY","QQQ","DIA","IWM","VTI",
     "TQQQ","SOXL","UPRO","TECL","FNGU",
@@ -62,22 +297,60 @@ BASE_US = [
     "ARKK","KWEB","LABU","LABD",
     "TSLA","AAPL","NVDA","AMZN","MSFT","META","AMD"
 ]
-def get_top_us(limit = 30):
+# 종목명 등 잘 안 바뀌는 메타데이터는 디스크 캐시 (info 는 종목당 META_TTL 에 한 번만)
+US_META_FILE = os.path.join(CACHE_DIR, "meta_us.json")
+META_TTL = _env_float("WK_META_TTL", 7 * 86400)
+# 이번 사이클에 바뀐 메타 파일 — _run_feedquant 가 비우면서 changed_any 에 반영
+_META_CHANGED = set()
+
+def _fetch_us_meta(t):
+    """info → 메타. 조회 실패·이름 없음도 ticker 를 이름으로 남겨 META_TTL 동안 다시 묻지 않음"""
+    try:
+        _throttle("yahoo")
+        full = yf.Ticker(t).info or {}
+    except:
+        full = {}
+    name = full.get("longName") or full.get("shortName")
+    if not name:
+        return {"name": t, "at": int(time.time())}
+    return {"name": name, "short_name": full.get("shortName"), "quote_type": full.get("quoteType"), "at": int(time.time())}
+
+def us_names(tickers):
+    """{ticker: 표시 이름} — 캐시에 없거나 META_TTL 지난 종목만 info 조회 (실패하면 ticker 그대로)"""
+    meta = load_prev_bucket(US_META_FILE)
+    now = time.time()
+    stale = [t for t in tickers if now - float((meta.get(t) or {}).get("at") or 0) >= META_TTL]
+    if stale:
+        with _executor(min(FEED_WORKERS, len(stale))) as ex:
+            futs = [(t, ex.submit(_fetch_us_meta, t)) for t in stale]
+            for t, f in futs:
+                meta[t] = f.result()
+        if _save_json(US_META_FILE, meta): _META_CHANGED.add(US_META_FILE)
+    return {t: (meta.get(t) or {}).get("name") or t for t in tickers}
+
+def get_top_us(limit = 30, universe = None):
+    """universe(기본 BASE_US)를 일봉 배치로 한 번에 받아 마지막 봉 종가×거래량 순위"""
+    tickers = list(dict.fromkeys(universe or BASE_US))
+    try:
+        _throttle("yahoo", len(tickers))
+        raw = yf.download(tickers, period = "5d", interval = "1d", progress = False,
+                          auto_adjust = True, group_by = "ticker", threads = True)
+    except Exception as e:
+        _log(f"⚠️ US 순위 배치 실패: {e!r}")
+        return []
     values = []
-    for t in BASE_US:
+    for t in tickers:
         try:
-            tk = yf.Ticker(t)
-            info = tk.fast_info or {}
-            full = tk.info or {}
-            price = info.get("last_price") or full.get("previousClose") or full.get("lastPrice")
-            volume = info.get("last_volume") or full.get("volume")
-            if not price or not volume:
-                continue
-            val = float(price) * float(volume)
-            name = full.get("longName") or full.get("shortName") or t
-            values.append({"ticker": t, "value_b": val / 1e9, "name": name})
+            sub = _split_batch(raw, t).dropna(subset = ["Close"])
+            price = float(sub["Close"].iloc[-1]); volume = float(sub["Volume"].iloc[-1])
         except:
             continue
+        if not price or not volume:
+            continue
+        values.append({"ticker": t, "value_b": price * volume / 1e9})
+    names = us_names([v["ticker"] for v in values])
+    for v in values:
+        v["name"] = names[v["ticker"]]
     df = pd.DataFrame(values)
     if df.empty:
         return []
@@ -118,7 +391,6 @@ def ensure_safe_volume(df, interval):
     
 def collect_profile(df):
     import math
-    pf = {}
     o = df["open"].values; h = df["high"].values
     l = df["low"].values;  c = df["close"].values
     v = df["volume"].values
@@ -126,16 +398,20 @@ def collect_profile(df):
     last_high = h[-1]
     digits = int(math.floor(math.log10(last_high)))
     step = max(0.01, 10 ** (digits - 3))
-    # ── 2) 가중치
-    w_o, w_l, w_h, w_c = 0.2, 0.3, 0.3, 0.2
-    # ── 3) 매물대 계산
-    for i in range(len(c)):
-        vv = v[i] if v[i] > 0 else 10
-        for price, w in ((o[i], w_o), (l[i], w_l), (h[i], w_h), (c[i], w_c)):
-            slot = int((price + (0.5 * step)) / step)
-            pf[slot] = pf.get(slot, 0) + int(round(vv * w))
-    # ── 4) 정렬 + 실제가격 복원
-    pf_sorted = {round(slot * step, 2): vol for slot, vol in sorted(pf.items(), key=lambda x: x[1], reverse=True)}
+    # ── 2) 가중치 (시/저/고/종 순)
+    w = np.array([0.2, 0.3, 0.3, 0.2])
+    # ── 3) 매물대 계산: 전 봉 × 4가격 슬롯을 한 번에 구해 bincount 로 누적
+    price = np.column_stack((o, l, h, c)).astype("float64").ravel()
+    if np.isnan(price).any():
+        raise ValueError("cannot convert float NaN to integer")
+    vv = np.where(v > 0, v, 10).astype("float64")
+    wv = np.rint(vv[:, None] * w).astype("int64").ravel()
+    slots = ((price + (0.5 * step)) / step).astype("int64")
+    uniq, first, inv = np.unique(slots, return_index = True, return_inverse = True)
+    vol = np.bincount(inv.ravel(), weights = wv, minlength = len(uniq)).astype("int64")
+    # ── 4) 정렬(거래량 내림차순, 동률은 처음 나온 순) + 실제가격 복원
+    order = np.lexsort((first, -vol))
+    pf_sorted = {round(slot * step, 2): n for slot, n in zip(uniq[order].tolist(), vol[order].tolist())}
     pset = set(pf_sorted.keys())
     return pf_sorted, pset
     
@@ -143,8 +419,7 @@ def compute_energy_array(df):
     closes = df["close"].astype(float).values
     vols = df["volume"].astype(float).values
     n = len(closes)
-    ea = (closes * vols) * 1e-6
-    ea = np.round(ea, 3)
+    ea = energy(closes, vols)
     if n < 2:
         last = float(ea[-1]) if n > 0 else None
         return ea.tolist(), last
@@ -152,16 +427,22 @@ def compute_energy_array(df):
     last = float(ea[-2] * (v1 / v0)) if v0 > 0 else float(ea[-2])
     return ea.tolist(), round(last, 3)
 
-def load_ohlcv(code, interval="15m", count=77):
-    yf_code = f"{code[1:]}.KS" if re.match(r"A\d{6}", code) else code
-    period = "5d" if interval.endswith("m") else "77d"
-    raw = yf.download(yf_code, period=period, interval=interval,
-                      progress=False, auto_adjust=True)
+def _yf_symbol(code):
+    return REGISTRY.yahoo(code)
+
+def _yf_period(interval, derived=False):
+    if derived and interval in SOURCE_PERIOD: return SOURCE_PERIOD[interval]
+    return "5d" if interval.endswith("m") else "77d"
+
+def _finish_ohlcv(raw, yf_code, interval, count):
     if raw is None or raw.empty:
         return None, None
     raw = raw.tail(count)
     df = wk_ultra_flatten_ohlcv(raw)
     df = ensure_safe_volume(df, interval)
+    return df, _bar_meta(df, yf_code, interval)
+
+def _bar_meta(df, yf_code, interval):
     ts = pd.to_datetime(df["ts"], unit="ms", errors="coerce").dropna()
     if len(ts) >= 3:
         d1 = ts.iloc[-1] - ts.iloc[-2]
@@ -177,16 +458,211 @@ def load_ohlcv(code, interval="15m", count=77):
             d = pd.Timedelta(days=1)
     s = ts.iloc[-1] if len(ts) > 0 else pd.Timestamp.utcnow()
     e = s + d
-    return df, {
+    return {
         "symbol": yf_code,
         "rows": len(df),
         "last_bar_start": s.isoformat(),
         "last_bar_end": e.isoformat()
     }
 
-def build_cache_item(code, name, interval, count=77):
+def load_ohlcv(code, interval="15m", count=77):
+    yf_code = _yf_symbol(code)
+    _throttle("yahoo")
+    raw = yf.download(yf_code, period=_yf_period(interval), interval=interval,
+                      progress=False, auto_adjust=True)
+    return _finish_ohlcv(raw, yf_code, interval, count)
+
+# ============================================================
+# 봉 집계: 고해상도 원천 봉 1회 수신 → 상위 주기는 로컬 리샘플
+# ============================================================
+# 파생 주기 ← 원천 주기 (WK_FEED_DIRECT="15m,1wk" 처럼 지정한 주기는 야후에서 직접 수신)
+DERIVE_FROM = {"15m": "1m", "1wk": "1d"}
+DIRECT_IVS = {x.strip() for x in os.environ.get("WK_FEED_DIRECT", "").split(",") if x.strip()}
+# 원천 주기를 받는 기간 — 파생 주기가 직접 받던 때와 같은 구간을 덮도록
+#   1m 5일 → 15m 5일치, 1d 77일 → 1wk 77일치 (16~17봉, 직접 받던 주봉과 같은 모양)
+SOURCE_PERIOD = {"1m": "5d", "1d": "77d"}
+
+def fetch_groups(ivs):
+    """요청 주기 → {원천 주기: [그 원천에서 만들어 낼 주기]} (요청에 없는 원천은 받기만 하고 내보내지 않음)"""
+    groups = {}
+    for iv in ivs:
+        src = None if iv in DIRECT_IVS else DERIVE_FROM.get(iv)
+        groups.setdefault(src or iv, [])
+    for iv in ivs:
+        src = None if iv in DIRECT_IVS else DERIVE_FROM.get(iv)
+        groups[src or iv].append(iv)
+    return groups
+
+def resample_ohlcv(df, interval, market=None):
+    """flatten 된 df → interval 봉 (시가 first / 고가 max / 저가 min / 종가 last / 거래량 sum)
+    분봉은 시장 현지 시각의 세션 시가 기준 경계, 주봉은 현지 일봉을 월요일 시작 주로 묶는다."""
+    if df is None or df.empty:
+        return df
+    if interval.endswith("m"):
+        mins = int(interval[:-1])
+        idx = pd.to_datetime(df["ts"].values, unit = "ms", utc = True)
+        if market in SESSIONS: idx = idx.tz_convert(SESSIONS[market]["tz"])
+        rule, kw = f"{mins}min", {"origin": "start_day", "offset": f"{bar_offset(market, mins)}min"}
+    elif interval == "1d":
+        idx = pd.to_datetime(df["ts"].values, unit = "ms", utc = True)
+        if market in SESSIONS: idx = idx.tz_convert(SESSIONS[market]["tz"]).tz_localize(None)
+        else: idx = idx.tz_localize(None)
+        rule, kw = "D", {}
+    elif interval == "1wk":
+        # 일봉 ts 는 거래소 현지 자정(tz 없음) 그대로
+        idx = pd.to_datetime(df["ts"].values, unit = "ms")
+        rule, kw = "W-MON", {"label": "left", "closed": "left"}
+    else:
+        raise ValueError(f"unsupported resample interval: {interval}")
+    g = df.set_index(idx).resample(rule, **kw)
+    out = pd.DataFrame({
+        "open": g["open"].first(), "high": g["high"].max(), "low": g["low"].min(),
+        "close": g["close"].last(), "volume": g["volume"].sum(),
+    }).dropna(subset = ["open"])
+    bins = out.index.tz_convert("UTC").tz_localize(None) if out.index.tz is not None else out.index
+    ts = ((bins - pd.Timestamp(0)) // pd.Timedelta(milliseconds = 1)).astype("int64")
+    return pd.DataFrame({"ts": ts, "open": out["open"].values, "high": out["high"].values,
+                         "low": out["low"].values, "close": out["close"].values,
+                         "volume": out["volume"].values.astype("int64")})
+
+def _frames(flat, sym, src, emit, count):
+    """원천 주기 flatten df → {iv: (df, meta)} (emit 중 원천 외 주기는 리샘플)"""
+    out = {}
+    for iv in emit:
+        df = flat if iv == src else resample_ohlcv(flat, iv, market_of(sym))
+        df = ensure_safe_volume(df.tail(count), iv)
+        out[iv] = (df, _bar_meta(df, sym, iv)) if df is not None and len(df) else (None, None)
+    return out
+
+# ============================================================
+# 멀티 티커 일괄 다운로드
+# ============================================================
+# 한 번의 yf.download 에 묶을 종목 수 (0/1 → 종목별 단건 다운로드)
+BATCH_SIZE = int(os.environ.get("WK_FEED_BATCH", "40") or 0)
+# 요청 자체가 예외로 끝난 종목 — 응답에 없던 종목 (None, None) 과 구분 (레지스트리 실패로 세지 않음)
+FETCH_ERROR = (None, {"error": True})
+
+def fetch_errored(v):
+    return v is not None and v[0] is None and bool(v[1]) and bool(v[1].get("error"))
+
+def _split_batch(raw, yf_code):
+    if raw is None or raw.empty or not isinstance(raw.columns, pd.MultiIndex):
+        return None
+    key = yf_code.upper()
+    if key not in raw.columns.get_level_values(0):
+        return None
+    # 합집합 인덱스로 재정렬된 프레임 → 해당 종목 봉만 남김
+    return raw[key].dropna(how = "all")
+
+def load_ohlcv_batch(codes, interval="15m", count=77, threads=True, emit=None):
+    """codes 를 interval 원천으로 한 번에 받아 {iv: {code: (df, meta)}} 로 쪼개 돌려준다.
+    emit 은 내보낼 주기 (기본 interval 하나, 상위 주기는 리샘플); 응답에 없는 종목은 (None, None),
+    요청이 예외로 끝난 종목(단건 폴백까지 실패)은 FETCH_ERROR."""
+    emit = list(emit or (interval,))
+    syms = {cd: _yf_symbol(cd) for cd in codes}
+    tickers = sorted(set(syms.values()))
+    out = {iv: {} for iv in emit}
+    try:
+        _throttle("yahoo", len(tickers))
+        raw = yf.download(tickers, period=_yf_period(interval, emit != [interval]), interval=interval,
+                          progress=False, auto_adjust=True, group_by="ticker", threads=threads)
+    except Exception as e:
+        # 배치 자체가 깨지면 종목별 단건으로 폴백
+        _log(f"⚠️ 배치 다운로드 실패({interval}, {len(codes)}종목){' → 단건 폴백' if len(codes) > 1 else ''}: {e!r}")
+        for cd in codes:
+            got = load_ohlcv_batch([cd], interval, count, threads, emit) if len(codes) > 1 else {}
+            for iv in emit: out[iv][cd] = got.get(iv, {}).get(cd, FETCH_ERROR)
+        return out
+    for cd, sym in syms.items():
+        try:
+            sub = _split_batch(raw, sym)
+            got = _frames(wk_ultra_flatten_ohlcv(sub), sym, interval, emit, count) if sub is not None and not sub.empty else {}
+        except Exception as e:
+            _log(f"⚠️ 배치 분리 실패: code={cd}, interval={interval}: {e!r}")
+            got = {}
+        for iv in emit: out[iv][cd] = got.get(iv, (None, None))
+    return out
+
+# ============================================================
+# 증분 갱신: 직전 스냅샷 + 마지막 확정봉 이후만 받아 이어붙임
+# ============================================================
+INCREMENTAL = os.environ.get("WK_FEED_INCREMENTAL", "1") not in ("", "0")
+DELTA_TOL = 1e-3   # 겹치는 확정봉 종가 허용 오차 (넘으면 수정주가 변동으로 보고 전체 재수신)
+
+def load_prev_bucket(path):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding = "utf-8") as f:
+            return json.load(f)
+    except:
+        return {}
+
+def _delta_anchor(prev):
+    """직전 스냅샷의 마지막 확정봉(끝에서 두 번째) ts(ms), 쓸 수 없으면 None"""
+    try:
+        ts = prev["ohlcv"]["ts"]
+        return int(ts[-2]) if len(ts) >= 3 else None
+    except:
+        return None
+
+def _yf_start(ms, interval):
+    # 분봉은 epoch 초, 일/주봉은 거래소 현지 날짜 (일봉 ts 는 현지 자정)
+    if interval.endswith("m"): return int(ms) // 1000
+    return pd.Timestamp(int(ms), unit = "ms").strftime("%Y-%m-%d")
+
+def splice_ohlcv(prev, new, count=77):
+    """prev 의 확정봉부터를 new 로 교체해 count 개로 자름; 구간 단절/종가 불일치면 None"""
+    if new is None or new.empty:
+        return None
+    old = pd.DataFrame(prev["ohlcv"])
+    anchor = int(old["ts"].iloc[-2])
+    hit = new.index[new["ts"] == anchor]
+    if len(hit) == 0:
+        return None
+    c0 = float(old["close"].iloc[-2]); c1 = float(new.loc[hit[0], "close"])
+    if abs(c1 - c0) > DELTA_TOL * max(abs(c0), 0.01):
+        return None
+    df = pd.concat([old[old["ts"] < anchor], new[new["ts"] >= anchor]], ignore_index = True)
+    return df.tail(count).reset_index(drop = True)
+
+def load_ohlcv_delta(prevs, interval="15m", count=77, threads=True, emit=None):
+    """prevs={code: {iv: 직전 item}} → emit 주기 모두 이어붙이기에 성공한 종목만 {iv: {code: (df, meta)}}"""
+    emit = list(emit or (interval,))
+    syms = {cd: _yf_symbol(cd) for cd in prevs}
+    tickers = sorted(set(syms.values()))
+    # 파생 주기의 확정봉까지 다시 만들 수 있도록 가장 이른 기준봉부터 받는다
+    start = min(_delta_anchor(it) for p in prevs.values() for it in p.values())
+    out = {iv: {} for iv in emit}
     try:
-        df, meta = load_ohlcv(code, interval, count)
+        _throttle("yahoo", len(tickers))
+        raw = yf.download(tickers, start=_yf_start(start, interval), interval=interval,
+                          progress=False, auto_adjust=True, group_by="ticker", threads=threads)
+    except Exception as e:
+        _log(f"⚠️ 증분 다운로드 실패({interval}, {len(tickers)}종목): {e!r}")
+        return out
+    for cd, sym in syms.items():
+        try:
+            sub = _split_batch(raw, sym)
+            if sub is None or sub.empty:
+                continue
+            flat = wk_ultra_flatten_ohlcv(sub)
+            got = {}
+            for iv in emit:
+                new = flat if iv == interval else resample_ohlcv(flat, iv, market_of(sym))
+                df = splice_ohlcv(prevs[cd][iv], ensure_safe_volume(new, iv), count)
+                if df is None:
+                    break
+                got[iv] = (df, _bar_meta(df, sym, iv))
+            if len(got) == len(emit):
+                for iv in emit: out[iv][cd] = got[iv]
+        except Exception as e:
+            _log(f"⚠️ 증분 병합 실패: code={cd}, interval={interval}: {e!r}")
+    return out
+
+def build_cache_item(code, name, interval, count=77, loaded=None):
+    try:
+        df, meta = loaded if loaded is not None else load_ohlcv(code, interval, count)
         if df is None or df.empty:
             return None
 
@@ -194,6 +670,7 @@ def build_cache_item(code, name, interval, count=77):
         ea, ea_last = compute_energy_array(df)
 
         symbol = meta.get("symbol")
+        es = energy_stats(df["ts"].values, ea, interval, market_of(symbol or code))
         rows = meta.get("rows")
         lbs = meta.get("last_bar_start")
         lbe = meta.get("last_bar_end")
@@ -212,6 +689,7 @@ def build_cache_item(code, name, interval, count=77):
             "price_set": sorted(list(pset)),
             "energies": ea,
             # "energy_last": ea_last,
+            "energy_stats": es,
             "ohlcv": df.to_dict("list"),
         }
 
@@ -304,75 +782,440 @@ def load_forced_json(path,is_kr=False):
     except:
         return {}
 
-def run_feedquant():
-    _log("▶ WkFeedQuant 시작")
+def _load_chunk(codes,src,emit,prev=None):
+    """다운로드 작업 단위 하나 → ({iv:{code:(df,meta)}}, 증분 성공 수) (풀 워커에서 실행)"""
+    # 직전 스냅샷이 emit 주기 모두에 있는 종목은 증분, 단절/불일치/신규 종목만 전체 수신
+    # 동시성은 바깥 풀이 담당 → yfinance 내부 스레드는 끔
+    prev=prev or {}
+    prevs={cd:{iv:prev[iv][cd] for iv in emit} for cd in codes if all(cd in prev.get(iv,{}) for iv in emit)}
+    out=load_ohlcv_delta(prevs,src,threads=False,emit=emit) if prevs else {iv:{} for iv in emit}
+    n_delta=len(out[emit[0]])
+    rest=[cd for cd in codes if cd not in out[emit[0]]]
+    if rest:
+        got=load_ohlcv_batch(rest,src,threads=False,emit=emit)
+        for iv in emit: out[iv].update(got[iv])
+    return out,n_delta
 
-    ivs=("1m","15m","1d","1wk")
+def _fetch_all(ex,jobs,prev=None,deadline=None):
+    """jobs=[(tag,src,emit,codes)] 우선순위 순 → ({(tag,iv):{code:(df,meta)}}, {(tag,iv):{시간 예산으로 못 받은 code}})
+    제출 순서대로 모아 결과가 실행 순서와 무관. deadline(monotonic)이 지나 시작 못 한 작업은 건너뜀"""
+    prev=prev or {}
+    futs=[]
+    for tag,src,emit,codes in jobs:
+        p={iv:prev.get((tag,iv),{}) for iv in emit}
+        futs.append(((tag,src,tuple(emit),codes),ex.submit(_load_job,codes,src,emit,p,deadline)))
+    loaded={}; late={}; n_delta={}
+    for (tag,src,emit,codes),f in futs:
+        got=f.result()
+        if got is None:
+            for iv in emit: late.setdefault((tag,iv),set()).update(codes)
+            continue
+        got,nd=got
+        for iv in emit: loaded.setdefault((tag,iv),{}).update(got[iv])
+        n_delta[(tag,src,emit)]=n_delta.get((tag,src,emit),0)+nd
+    for (tag,src,emit),nd in n_delta.items():
+        n=len(loaded.get((tag,emit[0]),{}))
+        _log(f"  ↻ {tag} {src}→{','.join(emit)}: 증분 {nd} / 전체 {n-nd}")
+    return loaded,late
 
-    kr_list=get_top_kr(limit=77)
-    forced_kr_dyn=load_forced_json(FORCED_KR_FILE,is_kr=True)
+def _load_job(codes,src,emit,prev,deadline=None):
+    if deadline is not None and time.monotonic()>=deadline:
+        return None
+    return _load_chunk(codes,src,emit,prev)
 
-    merged_kr={(cd,nm):(pct,val) for nm,cd,pct,val in kr_list}
-    for cd,nm in forced_kr_dyn.items():
-        merged_kr.setdefault((cd,nm),(0,0))
-    for pure,nm in FORCED_KR.items():
-        cd=f"A{pure}"
-        merged_kr.setdefault((cd,nm),(0,0))
-    kr_list=[(nm,cd,p,v) for (cd,nm),(p,v) in merged_kr.items()]
+def _prev_items(bucket,entries):
+    """직전 버킷 → 증분 갱신에 쓸 수 있는 {code: item} (야후 심볼이 같은 것만)"""
+    out={}
+    for key,cd,_ in entries:
+        it=bucket.get(key)
+        if it and it.get("symbol")==_yf_symbol(cd) and _delta_anchor(it) is not None:
+            out[cd]=it
+    return out
 
-    us_list=get_top_us(limit=77)
-    forced_us_dyn=load_forced_json(FORCED_US_FILE,is_kr=False)
+def _fill_buckets(tag,entries,ivs,buckets,loaded,carry=None,olds=None):
+    """entries=[(key,code,name)] → 주기별 buckets[iv][key] 채움 (목록 순서 그대로). 반환: {iv: 새로 만든 item 수}
+    carry={iv:{code:직전 item}}: 이번에 받지 않은(예산으로 미룬) 종목은 직전 item 을 그대로 유지
+    olds={iv:{code:직전 item}}: 받았는데 실패한 종목도 직전 item 이 있으면 그것으로 (빈 칸으로 덮지 않음)"""
+    carry=carry or {}; olds=olds or {}
+    fresh={}
+    for iv in ivs:
+        got=loaded.get((tag,iv),{})
+        keep=carry.get(iv,{}); old=olds.get(iv,{})
+        fresh[iv]=0
+        for key,cd,nm in entries:
+            if cd in keep:
+                buckets[iv][key]=dict(keep[cd],name=nm)
+                continue
+            it=build_cache_item(cd,nm,iv,loaded=got.get(cd,(None,None)))
+            if it:
+                if not buckets[iv]: _log_json(it)
+                buckets[iv][key]=it; fresh[iv]+=1
+                _log(f"  ✔ {tag} {cd} {iv}")
+            elif cd in old:
+                buckets[iv][key]=dict(old[cd],name=nm)
+    return fresh
 
-    merged={it["ticker"]:it for it in us_list}
-    for cd,nm in forced_us_dyn.items():
-        merged.setdefault(cd,{"ticker":cd,"name":f"{nm} ⚡"})
-    for cd,nm in FORCED_US.items():
-        merged.setdefault(cd,{"ticker":cd,"name":nm})
-    for cd in ("MSTX","MSTU","MSTZ"):
-        merged.setdefault(cd,{"ticker":cd,"name":FORCED_US.get(cd,cd)})
-    us_list=list(merged.values())
+def run_feedquant(workers=None,incremental=None,schedule=None):
+    workers=FEED_WORKERS if workers is None else workers
+    incremental=INCREMENTAL if incremental is None else incremental
+    _log(f"▶ WkFeedQuant 시작 (workers={workers}{', serial' if workers<=1 else ''}, {'증분' if incremental else '전체'})")
+    with _executor(workers) as ex:
+        return _run_feedquant(ex,incremental,schedule=schedule)
 
-    idx_list=[{"ticker":k,"name":v} for k,v in IDX_LIST.items()]
+MARKETS=(("KR","kr"),("US","us"),("IDX","ix"))
 
-    _log(f"🇰🇷 KR {len(kr_list)}개 / 🇺🇸 US {len(us_list)}개 / 📈 IDX {len(idx_list)}개")
+# 시장별 종목: 순위 + 강제 목록을 레지스트리에 합쳐 (코드 중복은 앞 출처, 죽은 종목 제외)
+REGISTRY = SymbolRegistry(os.path.join(CACHE_DIR, "symbol_registry.json"))
+# 한 시장에서 이 비율을 넘게 한꺼번에 비면 종목 문제가 아니라 업스트림 장애로 보고 실패를 세지 않음
+MASS_FAIL = float(os.environ.get("WK_REGISTRY_MASS_FAIL", "0.5") or 1)
 
-    buckets_kr={iv:{} for iv in ivs}
-    buckets_us={iv:{} for iv in ivs}
-    buckets_idx={iv:{} for iv in ivs}
+def _universe(ex,mks=("kr","us","ix")):
+    """순위 + 강제 목록 → ((TAG,mk,[(key,code,name)]) …) — mks 에 든 시장만 조회"""
+    # 네이버/야후 순위 조회는 서로 다른 업스트림 → 동시에
+    f_kr=ex.submit(get_top_kr,limit=77) if "kr" in mks else None
+    f_us=ex.submit(get_top_us,limit=77) if "us" in mks else None
+    src={}
+    if f_kr:
+        src["kr"]=([(cd,nm,exch) for nm,cd,_,_,exch in f_kr.result()]
+                   +[(cd,nm,None) for cd,nm in load_forced_json(FORCED_KR_FILE,is_kr=True).items()]
+                   +[(f"A{pure}",nm,None) for pure,nm in FORCED_KR.items()])
+    if f_us:
+        src["us"]=([(it["ticker"],it["name"],None) for it in f_us.result()]
+                   +[(cd,f"{nm} ⚡",None) for cd,nm in load_forced_json(FORCED_US_FILE,is_kr=False).items()]
+                   +[(cd,nm,None) for cd,nm in FORCED_US.items()]
+                   +[(cd,FORCED_US.get(cd,cd),None) for cd in ("MSTX","MSTU","MSTZ")])
+    if "ix" in mks:
+        src["ix"]=[(cd,nm,None) for cd,nm in IDX_LIST.items()]
 
-    for nm,cd,p,v in kr_list:
-        pure=cd[1:]
-        for iv in ivs:
-            it=build_cache_item(cd,nm,iv)
-            if it:
-                if not buckets_kr[iv]: _log(wkjson_dumps(it))
-                buckets_kr[iv][pure]=it
-                _log(f"  ✔ KR {cd} {iv}")
+    out=[]; dead={}
+    for tag,mk in MARKETS:
+        if mk not in src: continue
+        rows,dead[tag]=REGISTRY.merge(mk,src[mk])
+        out.append((tag,mk,[(cd[1:] if mk=="kr" else cd,cd,nm) for cd,nm in rows]))
 
-    for it in us_list:
-        cd,nm=it["ticker"],it["name"]
-        for iv in ivs:
-            item=build_cache_item(cd,nm,iv)
-            if item:
-                if not buckets_us[iv]: _log(wkjson_dumps(item))
-                buckets_us[iv][cd]=item
-                _log(f"  ✔ US {cd} {iv}")
-
-    for it in idx_list:
-        cd,nm=it["ticker"],it["name"]
+    flags={"KR":"🇰🇷","US":"🇺🇸","IDX":"📈"}
+    _log(" / ".join(f"{flags[tag]} {tag} {len(ents)}개"+(f" (죽은 종목 {dead[tag]}개 제외)" if dead[tag] else "") for tag,_,ents in out))
+    return tuple(out)
+
+# ============================================================
+# 갱신 스케줄: (시장, 주기)마다 장중 간격을 두고, 휴장 중에는 마감 후 한 번만
+#   - 장중: 직전 갱신 뒤 CADENCE[iv] 초가 지났으면 (WK_FEED_CADENCE="1d=900,1wk=3600" 로 조정)
+#   - 휴장(주말·휴일·장외): 마감 + SETTLE 초 이후 아직 안 받았으면 한 번 (확정봉 반영)
+#   - 마지막 갱신 시각은 cache/schedule.json, WK_FEED_SCHEDULE=0 또는 --all 이면 전부 갱신
+# ============================================================
+SCHEDULE = os.environ.get("WK_FEED_SCHEDULE", "1") not in ("", "0")
+SCHEDULE_FILE = os.path.join(CACHE_DIR, "schedule.json")
+CADENCE = {"1m": 0, "15m": 0, "1d": 1800, "1wk": 7200}
+SETTLE = _env_float("WK_FEED_SETTLE", 900)
+CADENCE_SLACK = 60   # cron 지연으로 간격이 살짝 모자라 한 바퀴 밀리는 것 방지
+
+def _cadence():
+    c = dict(CADENCE)
+    for kv in os.environ.get("WK_FEED_CADENCE", "").split(","):
+        k, _, v = kv.partition("=")
+        try: c[k.strip()] = float(v)
+        except: pass
+    return c
+
+def due_buckets(mks, ivs, last, now=None):
+    """last={"kr_1m": 직전 갱신 epoch 초} → 지금 갱신할 {(mk, iv)}"""
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    t = now.timestamp(); cad = _cadence(); due = set()
+    for mk in mks:
+        op = is_open(mk, now)
+        lc = last_close(mk, now)
+        lc = lc.timestamp() if lc else 0
         for iv in ivs:
-            item=build_cache_item(cd,nm,iv)
-            if item:
-                if not buckets_idx[iv]: _log(wkjson_dumps(item))
-                buckets_idx[iv][cd]=item
-                _log(f"  ✔ IDX {cd} {iv}")
+            prev = last.get(f"{mk}_{iv}")
+            if prev is None: ok = True
+            elif op: ok = t - prev >= cad.get(iv, 0) - CADENCE_SLACK
+            else: ok = prev < lc + SETTLE <= t
+            if ok: due.add((mk, iv))
+    return due
+
+# ============================================================
+# 갱신 우선순위 + 예산: 점수 높은 종목부터 받고, 예산(시간/요청 수)을 넘는 종목은 다음 실행으로 미룸
+#   점수 = 에너지(직전 energies 끝값, 같은 작업 안에서 log 정규화)
+#        + 묵은 정도(last_bar_end 이후 지난 봉 수, STALE_BARS 에서 1)
+#        + 강제 목록(FORCED_KR/US, forced_*.json) 가산 + 직전 실행에서 밀린 종목 가산
+#   미룬 종목은 cache/deferred.json 에 남기고, 버킷에는 직전 item 을 그대로 둔다.
+#   그 버킷은 다음 실행에서 갱신 시점이 아니어도 미룬 종목만 받는다.
+# ============================================================
+BUDGET_SEC = _env_float("WK_FEED_BUDGET_SEC", 0)        # 한 실행의 다운로드 시간 예산(초), 0 = 무제한
+BUDGET_REQ = int(_env_float("WK_FEED_BUDGET_REQ", 0))   # 한 실행의 종목 요청 수 예산, 0 = 무제한
+DEFERRED_FILE = os.path.join(CACHE_DIR, "deferred.json")
+PRIORITY_W = {"energy": 1.0, "stale": 1.0, "forced": 0.3, "deferred": 3.0}
+STALE_BARS = 30
+IV_MS = {"1m": 60_000, "15m": 900_000, "1d": 86_400_000, "1wk": 7 * 86_400_000}
+
+def _forced_codes():
+    kr = {f"A{k}" for k in FORCED_KR} | set(load_forced_json(FORCED_KR_FILE, is_kr = True))
+    return kr | set(FORCED_US) | set(load_forced_json(FORCED_US_FILE))
+
+def _stale_bars(it, iv, now_ms):
+    try:
+        end = pd.Timestamp(it["last_bar_end"]).value // 1_000_000
+        return max(0.0, (now_ms - end) / IV_MS.get(iv, 60_000))
+    except:
+        return float(STALE_BARS)
+
+def _last_energy(it):
+    try: return abs(float(it["energies"][-1]))
+    except: return 0.0
+
+def plan_jobs(groups, olds, deferred, now_ms, budget_req=0):
+    """groups=[(tag,src,emit,codes)], olds={(tag,iv):{code:직전 item}}, deferred={(tag,iv):{code}}
+    → (우선순위 순 작업 [(tag,src,emit,chunk)], 요청 예산으로 뺀 {(tag,iv):{code}})"""
+    forced = _forced_codes(); w = PRIORITY_W
+    ranked = []
+    for g, (tag, src, emit, codes) in enumerate(groups):
+        olds_iv = [olds.get((tag, iv), {}) for iv in emit]
+        es = {cd: _last_energy(olds_iv[0].get(cd)) for cd in codes}
+        emax = np.log1p(max(es.values(), default = 0.0)) or 1.0
+        for pos, cd in enumerate(codes):
+            stale = max(_stale_bars(o[cd], iv, now_ms) if cd in o else float(STALE_BARS) for o, iv in zip(olds_iv, emit))
+            score = (w["energy"] * np.log1p(es[cd]) / emax
+                     + w["stale"] * min(1.0, stale / STALE_BARS)
+                     + w["forced"] * (cd in forced)
+                     + w["deferred"] * any(cd in deferred.get((tag, iv), ()) for iv in emit))
+            ranked.append((-score, g, pos, cd))
+    ranked.sort()
+    cut = {}
+    if budget_req and len(ranked) > budget_req:
+        for _, g, _, cd in ranked[budget_req:]:
+            tag, _, emit, _ = groups[g]
+            for iv in emit: cut.setdefault((tag, iv), set()).add(cd)
+        ranked = ranked[:budget_req]
+    # 그룹별로 점수 순 청크 → 청크 첫 종목 점수 순으로 전체 정렬 (풀은 제출 순서대로 집어 감)
+    step = BATCH_SIZE if BATCH_SIZE > 1 else 1
+    per = {}
+    for r in ranked: per.setdefault(r[1], []).append(r)
+    chunks = []
+    for g, rs in per.items():
+        tag, src, emit, _ = groups[g]
+        for i in range(0, len(rs), step):
+            part = rs[i:i + step]
+            chunks.append((part[0][0], g, i, (tag, src, emit, [r[3] for r in part])))
+    chunks.sort(key = lambda c: c[:3])
+    return [c[3] for c in chunks], cut
+
+def _load_deferred():
+    """cache/deferred.json {"KR_1m": [code …]} → {(tag, iv): {code}}"""
+    out = {}
+    for k, codes in load_prev_bucket(DEFERRED_FILE).items():
+        tag, _, iv = k.rpartition("_")
+        out[(tag, iv)] = set(codes)
+    return out
+
+def _run_feedquant(ex,incremental=True,state=None,schedule=None):
+    """한 사이클: 스케줄 → 순위 → 우선순위/예산 → 다운로드 → 버킷 → 저장. 바뀐 버킷 목록 반환
+    state: 데몬의 메모리 상태 — 직전 버킷을 디스크 대신 여기서 잇고, 순위는 RANK_EVERY 초마다만 다시 조회
+    schedule: False 면 스케줄 무시하고 전부 갱신 (기본 SCHEDULE)"""
+    ivs=("1m","15m","1d","1wk")
+    schedule=SCHEDULE if schedule is None else schedule
+    now=datetime.datetime.now(datetime.timezone.utc)
+    deadline=time.monotonic()+BUDGET_SEC if BUDGET_SEC>0 else None
+    tags=dict((mk,tag) for tag,mk in MARKETS)
+
+    last=state.get("schedule") if state is not None else None
+    if last is None: last=load_prev_bucket(SCHEDULE_FILE)
+    deferred=state.get("deferred") if state is not None else None
+    if deferred is None: deferred=_load_deferred()
+    due=due_buckets([mk for _,mk in MARKETS],ivs,last,now) if schedule else {(mk,iv) for _,mk in MARKETS for iv in ivs}
+    # 갱신 시점이 아니어도 직전에 미룬 종목이 있는 버킷은 그 종목만 받음
+    partial={(mk,iv) for _,mk in MARKETS for iv in ivs if (mk,iv) not in due and deferred.get((tags[mk],iv))}
+    skipped=[f"{mk}_{iv}" for iv in ivs for _,mk in MARKETS if (mk,iv) not in due|partial]
+    if skipped: _log(f"⏭ 갱신 시점 아님: {', '.join(skipped)}")
+    want=[mk for _,mk in MARKETS if any((mk,iv) in due|partial for iv in ivs)]
 
+    unis=state.setdefault("universe",{}) if state is not None else {}
+    stale=[mk for mk in want if mk not in unis or time.monotonic()-unis[mk][0]>=RANK_EVERY]
+    if stale:
+        for m in _universe(ex,stale): unis[m[1]]=(time.monotonic(),m)
+    markets=[unis[mk][1] for mk in want]
+
+    mivs={mk:[iv for iv in ivs if (mk,iv) in due|partial] for _,mk,_ in markets}
+    buckets={(mk,iv):{} for _,mk,_ in markets for iv in mivs[mk]}
+    olds={}; groups=[]
+    for tag,mk,ents in markets:
+        for iv in mivs[mk]:
+            mem=state.get((mk,iv)) if state is not None else None
+            old=mem if mem is not None else load_prev_bucket(_bucket_path(mk,iv))
+            olds[(tag,iv)]={cd:old[key] for key,cd,_ in ents if key in old}
+        codes=list(dict.fromkeys(cd for _,cd,_ in ents))
+        for src,emit in fetch_groups(mivs[mk]).items():
+            if all((mk,iv) in partial for iv in emit):
+                codes_g=[cd for cd in codes if any(cd in deferred[(tag,iv)] for iv in emit if (tag,iv) in deferred)]
+            else:
+                codes_g=codes
+            if codes_g: groups.append((tag,src,emit,codes_g))
+    jobs,cut=plan_jobs(groups,olds,deferred,int(now.timestamp()*1000),BUDGET_REQ)
+    prev={}
+    if incremental:
+        for tag,mk,ents in markets:
+            for iv in mivs[mk]:
+                prev[(tag,iv)]=_prev_items({key:olds[(tag,iv)][cd] for key,cd,_ in ents if cd in olds[(tag,iv)]},ents)
+    loaded,late=_fetch_all(ex,jobs,prev,deadline)
+
+    # 이번에 안 받은 종목 = 예산으로 미룬 종목 + 부분 갱신 버킷의 나머지 → 직전 item 유지
+    asked={}
+    for tag,src,emit,codes in jobs:
+        for iv in emit: asked.setdefault((tag,iv),set()).update(codes)
+    new_deferred={}; fresh={}
+    for tag,mk,ents in markets:
+        carry={}
+        for iv in mivs[mk]:
+            put_off=cut.get((tag,iv),set())|late.get((tag,iv),set())
+            if put_off: new_deferred[f"{tag}_{iv}"]=sorted(put_off)
+            skip={cd for _,cd,_ in ents}-(asked.get((tag,iv),set())-late.get((tag,iv),set()))
+            carry[iv]={cd:it for cd,it in olds[(tag,iv)].items() if cd in skip}
+        n=_fill_buckets(tag,ents,mivs[mk],{iv:buckets[(mk,iv)] for iv in mivs[mk]},loaded,carry,
+                        {iv:olds[(tag,iv)] for iv in mivs[mk]})
+        for iv in mivs[mk]: fresh[(mk,iv)]=n[iv]
+    # 실제로 받아 본 종목의 성공/실패를 레지스트리에 (연속 실패하면 죽은 종목)
+    #   실패 = 요청은 성공했는데 응답에 그 종목이 없거나 빈 경우만. 요청 자체가 예외면 세지 않음
+    for tag,mk,ents in markets:
+        tried=set().union(*[asked.get((tag,iv),set())-late.get((tag,iv),set()) for iv in mivs[mk]])
+        res=[loaded.get((tag,iv),{}) for iv in mivs[mk]]
+        got={cd for r in res for cd,(df,_) in r.items() if df is not None and not df.empty}
+        err={cd for r in res for cd,v in r.items() if fetch_errored(v)}-got
+        miss=tried-got-err
+        if tried and len(miss|err)>MASS_FAIL*len(tried):
+            _log(f"⚠️ {tag}: {len(tried)}종목 중 {len(miss|err)}개 수신 실패 → 업스트림 장애로 보고 레지스트리 실패 집계 생략")
+            miss=set()
+        for cd in sorted(got&tried): REGISTRY.ok(mk,cd)
+        for cd in sorted(miss): REGISTRY.fail(mk,cd)
+    if new_deferred:
+        _log(f"⏳ 예산 초과로 다음 실행에 미룸: "+", ".join(f"{k} {len(v)}개" for k,v in new_deferred.items()))
+    # 이번에 손대지 않은 버킷에 걸린 미룸 목록은 그대로 이어감
+    for (tag,iv),codes in deferred.items():
+        mk=next((m for t,m in MARKETS if t==tag),None)
+        if codes and (mk,iv) not in buckets: new_deferred[f"{tag}_{iv}"]=sorted(codes)
+
+    changed=[]; stamp=int(now.timestamp())
+    last=dict(last)
     for iv in ivs:
-        _save_json(os.path.join(CACHE_DIR,f"all_kr_{iv}.json"),buckets_kr[iv])
-        _save_json(os.path.join(CACHE_DIR,f"all_us_{iv}.json"),buckets_us[iv])
-        _save_json(os.path.join(CACHE_DIR,f"all_ix_{iv}.json"),buckets_idx[iv])
+        for _,mk,_ in markets:
+            if (mk,iv) not in buckets: continue
+            if _save_bucket(mk,iv,buckets[(mk,iv)]): changed.append(f"{mk}_{iv}")
+            # 새로 받은 종목이 없는 버킷(수신 실패 → 직전 item 유지)과 미룬 종목만 받은 버킷은 갱신 시각을 남기지 않음
+            if fresh.get((mk,iv)) and (mk,iv) in due: last[f"{mk}_{iv}"]=stamp
+    extra=_save_json(SCHEDULE_FILE,last)
+    extra=_save_json(DEFERRED_FILE,new_deferred) or extra
+    extra=REGISTRY.save(_save_json) or extra
+    extra=bool(_META_CHANGED) or extra; _META_CHANGED.clear()
+    _report_changed(changed,len(buckets),extra)
+    if state is not None:
+        state.update(buckets); state["schedule"]=last
+        state["deferred"]={(k.rpartition("_")[0],k.rpartition("_")[2]):set(v) for k,v in new_deferred.items()}
 
     _log("✅ 캐시 저장 완료")
+    return changed
+
+# ============================================================
+# 데몬 모드: 프로세스 하나가 메모리에 버킷을 들고 주기적으로 갱신
+#   - 사이클마다 증분 갱신 → cache/ 에 원자적 교체로 저장
+#   - 바톤(newest-wins): 새 인스턴스가 첫 사이클(준비)을 마친 뒤 자기 run id 를 걸면
+#     이전 인스턴스는 다음 사이클 끝에서 그것을 보고 조용히 물러난다.
+#     GH_TOKEN + GITHUB_REPOSITORY 가 있으면 저장소 Actions 변수, 없으면 로컬 claim 파일.
+# ============================================================
+DAEMON_INTERVAL = _env_float("WK_FEED_DAEMON_INTERVAL", 60)   # 사이클 간격(초)
+DAEMON_BUDGET = _env_float("WK_FEED_DAEMON_BUDGET", 0)        # 최대 실행 시간(초), 0 = 무제한
+RANK_EVERY = _env_float("WK_FEED_RANK_EVERY", 600)            # 데몬에서 순위 재조회 간격(초)
+ACTIVE_VAR = "WKFEED_ACTIVE_DAEMON_RUN"
+CLAIM_FILE = os.environ.get("WK_FEED_CLAIM_FILE") or os.path.join(os.path.expanduser("~"), ".wk-cache", "wk_feed_daemon.run")
+
+def _gh_api(method, path, **kw):
+    token = os.environ.get("GH_TOKEN"); repo = os.environ.get("GITHUB_REPOSITORY")
+    if not token or not repo:
+        return None
+    return _HTTP.request(method, f"https://api.github.com/repos/{repo}/{path}", timeout = 10,
+                         headers = {"Authorization": f"token {token}", "Accept": "application/vnd.github+json"}, **kw)
+
+def _claim(run_id):
+    """바톤을 이 인스턴스로 (Actions 변수 또는 claim 파일). 반환: 실제로 건 곳 ("var" / "file")"""
+    try:
+        r = _gh_api("PATCH", f"actions/variables/{ACTIVE_VAR}", json = {"name": ACTIVE_VAR, "value": run_id})
+        if r is not None:
+            if r.status_code == 404:
+                r = _gh_api("POST", "actions/variables", json = {"name": ACTIVE_VAR, "value": run_id})
+            r.raise_for_status()
+            return "var"
+    except Exception as e:
+        _log(f"⚠️ 바톤 변수 갱신 실패 → claim 파일 사용: {e!r}")
+    os.makedirs(os.path.dirname(CLAIM_FILE), exist_ok = True)
+    tmp = CLAIM_FILE + f".{os.getpid()}"
+    with open(tmp, "w", encoding = "utf-8") as f:
+        f.write(run_id)
+    os.replace(tmp, CLAIM_FILE)
+    return "file"
+
+def _active_run_id(via = None):
+    """지금 바톤을 가진 run id (모르면 None → 계속 실행)
+    via: _claim 이 건 곳 — 변수 갱신에 실패해 claim 파일에 걸었으면 파일만 본다"""
+    if via != "file":
+        try:
+            r = _gh_api("GET", f"actions/variables/{ACTIVE_VAR}")
+            if r is not None:
+                return r.json().get("value") if r.ok else None
+        except Exception:
+            return None
+    try:
+        with open(CLAIM_FILE, "r", encoding = "utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def run_daemon(workers=None,incremental=None,interval=None,budget=None,run_id=None,schedule=None):
+    import signal, socket
+    workers=FEED_WORKERS if workers is None else workers
+    incremental=INCREMENTAL if incremental is None else incremental
+    interval=DAEMON_INTERVAL if interval is None else interval
+    budget=DAEMON_BUDGET if budget is None else budget
+    run_id=str(run_id or os.environ.get("GITHUB_RUN_ID") or f"{socket.gethostname()}-{os.getpid()}-{int(time.time())}")
+    stop=threading.Event()
+    for sig in (signal.SIGTERM,signal.SIGINT):
+        try: signal.signal(sig,lambda *_: stop.set())
+        except ValueError: pass   # 메인 스레드가 아니면 시그널 대신 stop 만
+    _log(f"▶ WkFeedQuant 데몬 시작 (run={run_id}, 간격 {interval:g}s, workers={workers}, {'증분' if incremental else '전체'})")
+    state={}; t0=time.monotonic(); claimed=None; cycle=0
+    with _executor(workers) as ex:
+        while not stop.is_set():
+            started=time.monotonic(); cycle+=1
+            try:
+                _run_feedquant(ex,incremental,state,schedule)
+            except Exception as e:
+                _log(f"⚠️ 사이클 {cycle} 실패: {e!r}")
+            if not claimed:
+                claimed=_claim(run_id)
+            active=_active_run_id(claimed)
+            if active and active!=run_id:
+                _log(f"[handoff] 바톤이 {active} 로 넘어감 → 종료"); break
+            if budget and time.monotonic()-t0>=budget:
+                _log(f"[relay-exit] 실행 예산 {budget:g}s 소진 → 종료"); break
+            _log(f"⏱ 사이클 {cycle} {time.monotonic()-started:.1f}s")
+            stop.wait(max(0.0,interval-(time.monotonic()-started)))
+    _log("⏹ WkFeedQuant 데몬 종료")
+
 
 if __name__=="__main__":
-    run_feedquant()
+    import argparse
+    ap=argparse.ArgumentParser(description="WkFeedQuant cache builder")
+    ap.add_argument("--workers",type=int,default=None,help=f"동시 다운로드 워커 수 (기본 {FEED_WORKERS}, env WK_FEED_WORKERS)")
+    ap.add_argument("--serial",action="store_true",help="디버그용 직렬 실행 (env WK_FEED_SERIAL=1)")
+    ap.add_argument("--full",action="store_true",help="직전 캐시를 무시하고 전체 재수신 (env WK_FEED_INCREMENTAL=0)")
+    ap.add_argument("--daemon",action="store_true",help="상주하며 주기적으로 갱신 (메모리 상태 유지, 새 인스턴스에 바톤 넘김)")
+    ap.add_argument("--interval",type=float,default=None,help=f"데몬 사이클 간격 초 (기본 {DAEMON_INTERVAL:g}, env WK_FEED_DAEMON_INTERVAL)")
+    ap.add_argument("--budget",type=float,default=None,help="데몬 최대 실행 시간 초, 0=무제한 (env WK_FEED_DAEMON_BUDGET)")
+    ap.add_argument("--run-id",default=None,help="바톤에 쓸 run id (기본 GITHUB_RUN_ID 또는 host-pid-시각)")
+    ap.add_argument("--all",action="store_true",help="갱신 스케줄 무시하고 모든 시장·주기 갱신 (env WK_FEED_SCHEDULE=0)")
+    args=ap.parse_args()
+    workers=1 if args.serial else args.workers
+    # 풀 밖에서 따로 여는 작은 풀(네이버 보드, US 메타)도 직렬로
+    if args.serial: FEED_WORKERS=1
+    incremental=False if args.full else None
+    schedule=False if args.all else None
+    if args.daemon:
+        run_daemon(workers=workers,incremental=incremental,interval=args.interval,budget=args.budget,run_id=args.run_id,schedule=schedule)
+    else:
+        run_feedquant(workers=workers,incremental=incremental,schedule=schedule)
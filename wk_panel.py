@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# 종목 × 봉 패널
+#   버킷(dict-of-lists) → 필드별 2D float64 배열 (행 = 종목, 열 = 봉) + 봉 유무 mask
+#   align="ts"  : 전 종목 ts 합집합 축에 맞춰 배치 (없는 봉은 NaN)
+#   align="tail": 종목마다 마지막 봉을 오른쪽 끝에 맞춤 (열 -1 = 각자의 마지막 봉, ts 도 2D)
+#   종목별 마지막 값·N 봉/세션 전 값을 종목 루프 없이 배열 연산 한 번으로 (섹터 합계는 sector_weather.aggregate).
+import numpy as np
+from wk_session import lookback_ms
+
+FIELDS = ("open", "high", "low", "close", "volume", "energy")
+
+class Panel:
+    def __init__(self, keys, names, symbols, ts, data, mask, align):
+        self.keys = keys; self.names = names; self.symbols = symbols
+        self.ts = ts            # align="ts": (T,) int64 / "tail": (N, T) int64 (빈 칸 -1)
+        self.data = data        # {field: (N, T) float64}
+        self.mask = mask        # (N, T) bool — 실제 봉이 있는 칸
+        self.align = align
+
+    def __len__(self): return len(self.keys)
+    def __getitem__(self, field): return self.data[field]
+
+    def _last_idx(self):
+        T = self.mask.shape[1]
+        # 행마다 마지막 True 위치 (봉이 하나도 없으면 -1)
+        rev = np.argmax(self.mask[:, ::-1], axis = 1)
+        return np.where(self.mask.any(axis = 1), T - 1 - rev, -1)
+
+    def _field(self, field):
+        # 필드 이름 또는 같은 모양의 (N, T) 배열 (파생 값)
+        return self.data[field] if isinstance(field, str) else field
+
+    def last(self, field):
+        """종목별 마지막 봉 값 (없으면 NaN)"""
+        i = self._last_idx()
+        out = np.full(len(self.keys), np.nan)
+        ok = i >= 0
+        out[ok] = self._field(field)[np.flatnonzero(ok), i[ok]]
+        return out
+
+    def last_ts(self):
+        i = self._last_idx()
+        ts = self.ts if self.ts.ndim == 2 else np.broadcast_to(self.ts, self.mask.shape)
+        out = np.full(len(self.keys), -1, dtype = "int64")
+        ok = i >= 0
+        out[ok] = ts[np.flatnonzero(ok), i[ok]]
+        return out
+
+    def _asof_idx(self, when):
+        # 행마다 ts 정렬 → 행 번호 × 2^42 를 더해 한 줄로 펴면 전체가 정렬 → searchsorted 한 번 (O(N log NT))
+        N, T = self.mask.shape
+        ts = self.ts if self.ts.ndim == 2 else np.broadcast_to(self.ts, self.mask.shape)
+        base = np.arange(N, dtype = "int64") << 42
+        flat = (ts + 1 + base[:, None]).ravel()
+        pos = np.searchsorted(flat, np.asarray(when, dtype = "int64") + 1 + base, side = "right") - 1 - np.arange(N) * T
+        # 그 칸이 빈 봉이면 왼쪽의 마지막 실제 봉으로
+        fill = np.maximum.accumulate(np.where(self.mask, np.arange(T), -1), axis = 1) if T else np.zeros((N, 0), dtype = "int64")
+        return np.where(pos >= 0, fill[np.arange(N), np.clip(pos, 0, max(T - 1, 0))] if T else -1, -1)
+
+    def asof(self, field, when):
+        """종목별로 when(ms, 스칼라 또는 (N,)) 이하 마지막 실제 봉의 값 (없으면 NaN)"""
+        when = np.broadcast_to(np.asarray(when, dtype = "int64"), (len(self.keys),))
+        i = self._asof_idx(when)
+        out = np.full(len(self.keys), np.nan)
+        hit = i >= 0
+        out[hit] = self._field(field)[np.flatnonzero(hit), i[hit]]
+        return out
+
+    def ago(self, field, window, market = None):
+        """종목별 마지막 봉 ts 에서 window("15m", "1h", "1d", "1wk" …, wk_session.lookback_ms) 전 시점 값"""
+        lt = self.last_ts()
+        u, inv = np.unique(lt, return_inverse = True)
+        when = np.array([lookback_ms(market, int(t), window) if t >= 0 else -1 for t in u], dtype = "int64")
+        return self.asof(field, when[inv.ravel()])
+
+def build_panel(bucket, fields = FIELDS, align = "ts", n = None):
+    """bucket={key: item} → Panel. n: 종목마다 마지막 n 봉만 (align="tail" 의 열 수)"""
+    keys = list(bucket)
+    names = [bucket[k].get("name") or k for k in keys]
+    symbols = [bucket[k].get("symbol") or k for k in keys]
+    series = []
+    for k in keys:
+        it = bucket[k]; o = it.get("ohlcv") or {}
+        ts = np.asarray(o.get("ts") or [], dtype = "int64")
+        cols = {}
+        for f in fields:
+            if f == "energy":
+                en = it.get("energies")
+                v = np.asarray(en if en is not None and len(en) == len(ts) else np.full(len(ts), np.nan), dtype = "float64")
+            else:
+                src = o.get(f)
+                v = np.asarray(src if src is not None and len(src) == len(ts) else np.full(len(ts), np.nan), dtype = "float64")
+            cols[f] = v
+        if n is not None:
+            ts = ts[-n:] if n else ts[:0]
+            cols = {f: v[len(v) - len(ts):] for f, v in cols.items()}
+        series.append((ts, cols))
+    N = len(keys)
+    if align == "tail":
+        T = max((len(ts) for ts, _ in series), default = 0) if n is None else n
+        tsm = np.full((N, T), -1, dtype = "int64")
+        data = {f: np.full((N, T), np.nan) for f in fields}
+        mask = np.zeros((N, T), dtype = bool)
+        for r, (ts, cols) in enumerate(series):
+            m = len(ts)
+            if not m: continue
+            tsm[r, T - m:] = ts; mask[r, T - m:] = True
+            for f in fields: data[f][r, T - m:] = cols[f]
+        return Panel(keys, names, symbols, tsm, data, mask, align)
+    axis = np.unique(np.concatenate([ts for ts, _ in series])) if series else np.zeros(0, dtype = "int64")
+    data = {f: np.full((N, len(axis)), np.nan) for f in fields}
+    mask = np.zeros((N, len(axis)), dtype = bool)
+    for r, (ts, cols) in enumerate(series):
+        if not len(ts): continue
+        j = np.searchsorted(axis, ts)
+        mask[r, j] = True
+        for f in fields: data[f][r, j] = cols[f]
+    return Panel(keys, names, symbols, axis, data, mask, align)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# 순위 인덱스 (cache/rank_{kr,us,ix}_{iv}.json)
+#   버킷을 쓸 때 함께 만들어 두는 몇 KB 짜리 요약 — 명령 스크립트는 이것만 읽고 답한다.
+#   {"market", "interval", "rows": [{key, name, symbol, energy, d15m, d1d, z, surge, tod} … 마지막 에너지 내림차순],
+#    "by_d15m": [key …], "by_d1d": [key …]}
+#   Δ 는 마지막 봉 ts 에서 15분/1세션 전 시점(wk_session.lookback_ms, 그 이전 마지막 봉)의 에너지와의 차이
+#   — sector_weather 의 d15/d1d 와 같은 기준.
+#   z/surge/tod 는 빌드 때 계산해 둔 item["energy_stats"] 를 옮겨 온 것 (wk_energy).
+import os, json
+import numpy as np
+from wk_session import lookback_ms
+
+LOOKBACK = {"d15m": "15m", "d1d": "1d"}
+# 일/주봉 ts 는 현지 자정(tz 없음)이라 세션 계산 대신 고정 24h (sector_weather.lookbacks 와 같게)
+DAILY_LOOKBACK = {"d15m": "15m", "d1d": "24h"}
+STAT_KEYS = ("z", "surge", "tod")
+SORT_KEYS = ("energy",) + tuple(LOOKBACK)
+
+def rank_path(json_path):
+    d, fn = os.path.split(json_path)
+    return os.path.join(d, "rank_" + fn[len("all_"):] if fn.startswith("all_") else "rank_" + fn)
+
+def _deltas(ts, en, market = None, interval = None):
+    ts = np.asarray(ts, dtype = "int64"); en = np.asarray(en, dtype = "float64")
+    out = {}
+    for k, window in (DAILY_LOOKBACK if interval in ("1d", "1wk") else LOOKBACK).items():
+        i = int(np.searchsorted(ts, lookback_ms(market, int(ts[-1]), window), side = "right")) - 1
+        out[k] = round(float(en[-1] - en[i]), 3) if 0 <= i < len(ts) - 1 else None
+    return out
+
+def build_rank(bucket, market = None, interval = None):
+    rows = []
+    for key, it in bucket.items():
+        en = it.get("energies") or []
+        ts = (it.get("ohlcv") or {}).get("ts") or []
+        if not en:
+            continue
+        row = {"key": key, "name": it.get("name") or key, "symbol": it.get("symbol") or key,
+               "energy": round(float(en[-1]), 3)}
+        row.update(_deltas(ts, en, market, interval) if len(ts) == len(en) else dict.fromkeys(LOOKBACK))
+        es = it.get("energy_stats") or {}
+        row.update({k: es.get(k) for k in STAT_KEYS})
+        rows.append(row)
+    order = lambda k: sorted(rows, key = lambda r: -r[k] if r[k] is not None else float("inf"))
+    rows = order("energy")
+    out = {"market": market, "interval": interval, "rows": rows}
+    for k in LOOKBACK:
+        out[f"by_{k}"] = [r["key"] for r in order(k) if r[k] is not None]
+    return out
+
+def save_rank(json_path, bucket, market = None, interval = None):
+    path = rank_path(json_path)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding = "utf-8") as f:
+        json.dump(build_rank(bucket, market, interval), f, ensure_ascii = False, separators = (",", ":"))
+    os.replace(tmp, path)
+
+def load_rank(json_path):
+    try:
+        with open(rank_path(json_path), "r", encoding = "utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def top(market, interval = "15m", n = 7, by = "energy", cache_dir = None):
+    """순위 상위 n 행 [{key, name, symbol, energy, d15m, d1d, z, surge, tod}] — 인덱스가 없으면 버킷에서 바로 계산"""
+    from wk_cache_reader import bucket_path, get_market
+    path = bucket_path(market, interval, cache_dir)
+    idx = load_rank(path)
+    if idx is None:
+        if not os.path.exists(path):
+            return []
+        idx = build_rank(get_market(market, interval, columns = ("ts", "energy"), cache_dir = cache_dir), market, interval)
+    if by == "energy":
+        return idx["rows"][:n]
+    if by in STAT_KEYS:
+        return sorted((r for r in idx["rows"] if r.get(by) is not None), key = lambda r: -r[by])[:n]
+    rows = {r["key"]: r for r in idx["rows"]}
+    return [rows[k] for k in idx.get(f"by_{by}", [])[:n]]
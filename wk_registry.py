@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# 종목 레지스트리 (cache/symbol_registry.json)
+#   {"kr": {"A005930": {"name", "yahoo": "005930.KS", "exchange": "KS", "resolved", "fails", "dead", "dead_at"}}, "us": …, "ix": …}
+#   - 순위/강제 목록에서 본 종목을 시장별로 쌓고, 야후 심볼(거래소 접미사)을 한 번 확정하면 계속 쓴다.
+#   - 거래소를 모르는 KR 코드(강제 목록)는 받기 실패할 때마다 .KS ↔ .KQ 를 번갈아 시도.
+#   - DEAD_AFTER 번 연속 실패하면 죽은 종목 → DEAD_RETRY 초 동안 목록에서 빼고 다시 받지 않는다.
+import re, json, time, threading
+
+DEAD_AFTER = 3
+DEAD_RETRY = 7 * 86400
+KR_SUFFIXES = ("KS", "KQ")
+
+def _is_kr(code):
+    # A + 6자리 (신규 ETF 의 영숫자 코드 0091P0 포함)
+    return bool(re.match(r"A\d[0-9A-Z]{5}$", code))
+
+class SymbolRegistry:
+    def __init__(self, path):
+        self.path = path
+        self.data = None
+        self.lock = threading.Lock()
+
+    def _load(self):
+        if self.data is None:
+            try:
+                with open(self.path, "r", encoding = "utf-8") as f:
+                    self.data = json.load(f)
+            except (OSError, ValueError):
+                self.data = {}
+        return self.data
+
+    def get(self, market, code):
+        with self.lock:
+            return (self._load().get(market) or {}).get(code)
+
+    def yahoo(self, code):
+        """코드 → 야후 심볼 (레지스트리에 없으면 KR 은 .KS, 나머지는 그대로)"""
+        if not _is_kr(code):
+            return code
+        ent = self.get("kr", code)
+        return (ent or {}).get("yahoo") or f"{code[1:7]}.KS"
+
+    def merge(self, market, rows, now = None):
+        """rows=[(code, name, exchange|None)] 우선순위 순 → 살아 있는 [(code, name)] (코드 중복은 앞의 것)
+        새 코드는 등록, 거래소를 알려 주면 확정, 이름은 가장 앞 출처의 것으로 갱신"""
+        now = now or time.time()
+        out = {}; dead = 0
+        with self.lock:
+            book = self._load().setdefault(market, {})
+            for code, name, exch in rows:
+                if code in out:
+                    continue
+                ent = book.setdefault(code, {})
+                if name: ent["name"] = name
+                if exch and _is_kr(code):
+                    ent["exchange"] = exch; ent["resolved"] = True
+                if _is_kr(code):
+                    ent.setdefault("exchange", KR_SUFFIXES[0])
+                    ent["yahoo"] = f"{code[1:7]}.{ent['exchange']}"
+                else:
+                    ent["yahoo"] = code
+                if ent.get("dead") and now - float(ent.get("dead_at") or 0) < DEAD_RETRY:
+                    dead += 1
+                    continue
+                out[code] = name or ent.get("name") or code
+        return list(out.items()), dead
+
+    def ok(self, market, code):
+        with self.lock:
+            ent = self._load().setdefault(market, {}).setdefault(code, {})
+            ent["resolved"] = True
+            for k in ("fails", "dead", "dead_at"):
+                ent.pop(k, None)
+
+    def fail(self, market, code, now = None):
+        """받기 실패 한 번 → 거래소 미확정 KR 은 접미사 전환, DEAD_AFTER 번째면 죽은 종목"""
+        with self.lock:
+            ent = self._load().setdefault(market, {}).setdefault(code, {})
+            ent["fails"] = int(ent.get("fails") or 0) + 1
+            if _is_kr(code) and not ent.get("resolved"):
+                i = KR_SUFFIXES.index(ent.get("exchange", KR_SUFFIXES[0])) if ent.get("exchange") in KR_SUFFIXES else 0
+                ent["exchange"] = KR_SUFFIXES[(i + 1) % len(KR_SUFFIXES)]
+                ent["yahoo"] = f"{code[1:7]}.{ent['exchange']}"
+            if ent.get("dead") or ent["fails"] >= DEAD_AFTER:   # 재시도 기간에 또 실패하면 바로 다시
+                ent["dead"] = True; ent["dead_at"] = int(now or time.time())
+                ent.pop("fails", None)
+
+    def save(self, save_json):
+        """save_json(path, obj) → 바뀌었으면 True"""
+        with self.lock:
+            data = self._load()
+            return save_json(self.path, data)
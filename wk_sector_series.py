@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# 섹터 에너지 시계열 (append-only)
+#   cache/sector_series/{market}_{interval}/YYYY-MM-DD.bin  — 스냅샷 시각(UTC) 날짜별 파일
+#   레코드 = 고정 폭 numpy 구조체 (REC, 64 바이트), 섹터/리더 한 줄씩 이어 붙이기만 한다.
+#   섹터 이름·종목 코드는 같은 폴더 names.json (append-only 목록)의 번호로 저장.
+#   sector_flow(…, hours=6) 은 해당 날짜 파일만 np.fromfile 로 읽어 답한다 (원본 캐시는 건드리지 않음).
+import os, sys, json, time, datetime
+import numpy as np
+
+SERIES_DIR = os.path.join(os.getcwd(), "cache", "sector_series")
+ENABLED = os.environ.get("WK_SECTOR_SERIES", "1") not in ("", "0")
+SECTOR, LEADER = 0, 1
+REC = np.dtype([
+    ("at", "<i8"),        # 스냅샷 시각 (ms)
+    ("bar_ts", "<i8"),    # 스냅샷의 마지막 봉 ts (ms)
+    ("kind", "u1"), ("rank", "u1"), ("_pad", "u2"),
+    ("sector", "<i4"),    # names 번호
+    ("code", "<i4"),      # names 번호 (섹터 행은 -1)
+    ("count", "<i4"),
+    ("now", "<f8"), ("d15", "<f8"), ("d1d", "<f8"), ("prev1", "<f8"),
+])
+
+def series_dir(market, interval, root = None):
+    return os.path.join(root or SERIES_DIR, f"{market}_{interval}")
+
+def _day(ms):
+    return datetime.datetime.fromtimestamp(ms / 1000, datetime.timezone.utc).date()
+
+class _Names:
+    def __init__(self, d):
+        self.path = os.path.join(d, "names.json")
+        try:
+            with open(self.path, "r", encoding = "utf-8") as f:
+                self.list = json.load(f)
+        except (OSError, ValueError):
+            self.list = []
+        self.ids = {s: i for i, s in enumerate(self.list)}
+        self.dirty = False
+    def id(self, s):
+        if s not in self.ids:
+            self.ids[s] = len(self.list); self.list.append(s); self.dirty = True
+        return self.ids[s]
+    def save(self):
+        if not self.dirty: return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding = "utf-8") as f:
+            json.dump(self.list, f, ensure_ascii = False)
+        os.replace(tmp, self.path)
+
+def append(report, at = None, root = None):
+    """sector_weather.sector_report() 결과 한 건 → 오늘 파일 끝에 추가. 같은 봉이 이미 마지막이면 건너뜀"""
+    if not ENABLED or not report or not report.get("sectors"):
+        return 0
+    bar_ts = int(report.get("bar_ts") or 0)
+    at = int(at if at is not None else time.time() * 1000)
+    d = series_dir(report["market"], report["interval"], root)
+    os.makedirs(d, exist_ok = True)
+    path = os.path.join(d, f"{_day(at).isoformat()}.bin")
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    if size % REC.itemsize:   # 지난번에 쓰다 만 꼬리 → 잘라 내고 이어 쓴다
+        size -= size % REC.itemsize
+        os.truncate(path, size)
+    if size:
+        last = np.fromfile(path, dtype = REC, offset = size - REC.itemsize)
+        if len(last) and int(last["bar_ts"][0]) == bar_ts:
+            return 0
+    names = _Names(d)
+    rows = []
+    for s in report["sectors"]:
+        sid = names.id(s["sector"])
+        rows.append((at, bar_ts, SECTOR, 0, 0, sid, -1, s["count"], s["now"], s["d15"], s["d1d"], s["prev1"]))
+        for r, ld in enumerate(s.get("leaders") or ()):
+            rows.append((at, bar_ts, LEADER, r, 0, sid, names.id(ld["code"]), 1, ld["last"], ld["d15"], ld["d1d"], ld["prev1"]))
+    names.save()   # 번호를 먼저 확정 → 레코드가 모르는 번호를 가리키지 않게
+    with open(path, "ab") as f:
+        f.write(np.array(rows, dtype = REC).tobytes())
+    return len(rows)
+
+def load(market, interval, since_ms, until_ms = None, root = None):
+    """[since, until] 스냅샷 레코드 (REC 배열, at 오름차순) + names 목록"""
+    until_ms = int(until_ms if until_ms is not None else time.time() * 1000)
+    d = series_dir(market, interval, root)
+    parts = []
+    day = _day(since_ms)
+    while day <= _day(until_ms):
+        path = os.path.join(d, f"{day.isoformat()}.bin")
+        if os.path.exists(path):
+            n = os.path.getsize(path) // REC.itemsize   # 쓰다 만 꼬리 레코드는 버린다
+            parts.append(np.fromfile(path, dtype = REC, count = n))
+        day += datetime.timedelta(days = 1)
+    recs = np.concatenate(parts) if parts else np.zeros(0, dtype = REC)
+    recs = recs[(recs["at"] >= since_ms) & (recs["at"] <= until_ms)]
+    return recs, _Names(d).list
+
+def sector_flow(market = "us", interval = "15m", hours = 6, now = None, root = None):
+    """최근 hours 시간 섹터 흐름 → [{sector, first, last, flow, points:[(at, now, d15, d1d)…]}] (flow 큰 순)
+    flow = 구간 마지막 스냅샷 에너지 - 첫 스냅샷 에너지"""
+    now = int(now if now is not None else time.time() * 1000)
+    recs, names = load(market, interval, now - int(hours * 3_600_000), now, root)
+    recs = recs[recs["kind"] == SECTOR]
+    if not len(recs):
+        return []
+    o = np.lexsort((recs["at"], recs["sector"]))
+    recs = recs[o]
+    cut = np.flatnonzero(np.diff(recs["sector"])) + 1
+    out = []
+    for g in np.split(recs, cut):
+        out.append({"sector": names[int(g["sector"][0])], "first": float(g["now"][0]), "last": float(g["now"][-1]),
+                    "flow": float(g["now"][-1] - g["now"][0]),
+                    "points": list(zip(g["at"].tolist(), g["now"].tolist(), g["d15"].tolist(), g["d1d"].tolist()))})
+    out.sort(key = lambda x: -x["flow"])
+    return out
+
+def leader_series(market, interval, code, hours = 24, now = None, root = None):
+    """한 종목이 리더로 잡힌 스냅샷들 → [(at, sector, energy, d15, d1d)]"""
+    now = int(now if now is not None else time.time() * 1000)
+    recs, names = load(market, interval, now - int(hours * 3_600_000), now, root)
+    cid = names.index(code) if code in names else -2
+    recs = recs[(recs["kind"] == LEADER) & (recs["code"] == cid)]
+    return [(int(r["at"]), names[int(r["sector"])], float(r["now"]), float(r["d15"]), float(r["d1d"])) for r in recs]
+
+# python wk_sector_series.py [market] [interval] [hours]
+if __name__ == "__main__":
+    a = sys.argv[1:]
+    mk, iv, hrs = (a + ["us", "15m", "6"][len(a):])[:3]
+    for s in sector_flow(mk, iv, float(hrs)):
+        print(f"  {s['sector']:24s} {s['last']:12.3f}  flow {s['flow']:+10.3f}  ({len(s['points'])} snapshots)")
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# 섹터 분류 저장소 (cache/sector_map.json)
+#   {"us": {"NVDA": {"sector": "Technology", "src": "yahoo", "at": 1787000000}, …}, …}
+#   - seed(market, code, name) 가 답하는 종목(ETF·테마 분류 등)은 바로 확정, 만료 없음.
+#   - 나머지는 fetch(야후 심볼) (야후 info 의 sector) 결과를 TTL 동안 재사용.
+#   - resolve() 는 유니버스 전체를 한 번에: 없거나 만료된 종목은 백그라운드 스레드로 받고
+#     WAIT 초까지만 기다린다 → 늦은 종목은 이전 값(없으면 "Unknown")으로 넘어가고, 받은 값은 다음 실행부터.
+import os, json, time, queue, threading
+
+SECTOR_FILE = os.path.join(os.getcwd(), "cache", "sector_map.json")
+TTL = int(os.environ.get("WK_SECTOR_TTL", str(30 * 86400)) or 0)
+UNKNOWN_TTL = 86400          # "Unknown" 은 하루 뒤 다시 물어본다
+WAIT = float(os.environ.get("WK_SECTOR_WAIT", "5") or 0)
+WORKERS = int(os.environ.get("WK_SECTOR_WORKERS", "8") or 1)
+UNKNOWN = "Unknown"
+
+def yahoo_sector(code):
+    """야후 info 의 sector (없으면 "Unknown", 받기 실패는 None → 저장 안 함)"""
+    import yfinance as yf
+    try:
+        return yf.Ticker(code).info.get("sector") or UNKNOWN
+    except:
+        return None
+
+class SectorStore:
+    def __init__(self, path = SECTOR_FILE, seed = None, fetch = yahoo_sector, ttl = TTL):
+        self.path = path
+        self.seed = seed
+        self.fetch = fetch
+        self.ttl = ttl
+        self.data = None
+        self.lock = threading.Lock()
+        self.todo = queue.Queue()
+        self.inflight = set()
+        self.workers = []
+
+    def _load(self):
+        if self.data is None:
+            try:
+                with open(self.path, "r", encoding = "utf-8") as f:
+                    self.data = json.load(f)
+            except (OSError, ValueError):
+                self.data = {}
+        return self.data
+
+    def _fresh(self, ent, now):
+        if not ent:
+            return False
+        if ent.get("src") == "seed":
+            return True
+        ttl = UNKNOWN_TTL if ent.get("sector") == UNKNOWN else self.ttl
+        return now - float(ent.get("at") or 0) < ttl
+
+    def _worker(self):
+        while True:
+            market, code, symbol = self.todo.get()
+            sec = self.fetch(symbol)
+            with self.lock:
+                if sec is not None:
+                    self._load().setdefault(market, {})[code] = {"sector": sec, "src": "yahoo", "at": int(time.time())}
+                self.inflight.discard((market, code))
+            self.todo.task_done()
+
+    def _submit(self, market, codes, symbols):
+        with self.lock:
+            new = [(market, c) for c in codes if (market, c) not in self.inflight]
+            self.inflight.update(new)
+            while len(self.workers) < min(WORKERS, len(self.inflight)):
+                t = threading.Thread(target = self._worker, daemon = True)
+                t.start(); self.workers.append(t)
+        for mk, cd in new:
+            self.todo.put((mk, cd, symbols.get(cd) or cd))
+
+    def resolve(self, codes, market = "us", wait = WAIT, now = None, names = None, symbols = None):
+        """codes → {code: sector}. 만료/미등록 종목은 백그라운드로 받고 wait 초까지만 기다린다
+        names/symbols: {code: 이름}/{code: 야후 심볼} (seed·fetch 에 넘김)"""
+        now = now or time.time()
+        names = names or {}; symbols = symbols or {}
+        out = {}; stale = []
+        with self.lock:
+            book = self._load().setdefault(market, {})
+            for cd in codes:
+                sec = self.seed(market, cd, names.get(cd)) if self.seed else None
+                if sec:
+                    book[cd] = {"sector": sec, "src": "seed"}
+                    out[cd] = sec; continue
+                ent = book.get(cd)
+                if not self._fresh(ent, now):
+                    stale.append(cd)
+                out[cd] = (ent or {}).get("sector")
+        if stale:
+            self._submit(market, stale, symbols)
+            end = time.time() + wait
+            while time.time() < end:
+                with self.lock:
+                    if not any((market, c) in self.inflight for c in stale): break
+                time.sleep(0.05)
+            with self.lock:
+                book = self._load()[market]
+                for cd in stale:
+                    out[cd] = (book.get(cd) or {}).get("sector") or out[cd]
+        self.save()
+        return {cd: sec or UNKNOWN for cd, sec in out.items()}
+
+    def get(self, code, market = "us", wait = WAIT):
+        return self.resolve([code], market, wait)[code]
+
+    def save(self):
+        with self.lock:
+            data = self._load()
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok = True)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding = "utf-8") as f:
+                json.dump(data, f, ensure_ascii = False, indent = 1, sort_keys = True)
+            os.replace(tmp, self.path)
+
+    def join(self, timeout = None):
+        """백그라운드로 받는 중인 종목을 timeout 초까지 기다렸다가 저장"""
+        end = None if timeout is None else time.time() + timeout
+        while True:
+            with self.lock:
+                if not self.inflight: break
+            if end is not None and time.time() >= end: break
+            time.sleep(0.05)
+        self.save()
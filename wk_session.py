@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os, re, json, datetime
+from zoneinfo import ZoneInfo
+
+#────────────────────────────────────────
+# 시장별 정규장 세션 (현지 시각)
+#────────────────────────────────────────
+SESSIONS = {
+    "kr": {"tz": "Asia/Seoul",       "open": "09:00", "close": "15:30"},
+    "us": {"tz": "America/New_York", "open": "09:30", "close": "16:00"},
+}
+KR_INDEX = ("^KS11", "^KQ11", "^KS200")
+US_INDEX = ("^NDX", "^DJI", "^GSPC", "^VIX", "^IXIC", "^RUT")
+
+def market_of(symbol):
+    """캐시 코드/야후 심볼 → "kr" | "us" | None (선물·환율·해외지수 등 세션 없는 상품)"""
+    s = str(symbol).upper()
+    if re.match(r"^A?\d[0-9A-Z]{5}(\.K[SQ])?$", s) or s in KR_INDEX: return "kr"
+    if s in US_INDEX: return "us"
+    if s.startswith("^") or "=" in s or "." in s: return None
+    return "us"
+
+def hhmm_minutes(hhmm):
+    h, m = hhmm.split(":")
+    return int(h) * 60 + int(m)
+
+def bar_offset(market, minutes):
+    """분봉 경계를 세션 시가에 맞추는 resample offset(분) — US 09:30 시가의 1h 봉 → 30"""
+    ss = SESSIONS.get(market)
+    return hhmm_minutes(ss["open"]) % minutes if ss else 0
+
+#────────────────────────────────────────
+# 휴장일 달력 (market_holidays.json: 휴장일 + 개장/마감 시각이 다른 날)
+#   "ix"(선물·환율·지수 묶음)는 미 동부 일 18:00 ~ 금 17:00 의 24x5 로 본다.
+#────────────────────────────────────────
+CALENDAR_FILE = os.environ.get("WK_CALENDAR_FILE") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "market_holidays.json")
+FUTURES = {"tz": "America/New_York", "open": "18:00", "close": "17:00"}   # 일요일 open, 금요일 close
+_calendar = None
+
+def calendar():
+    global _calendar
+    if _calendar is None:
+        try:
+            with open(CALENDAR_FILE, "r", encoding = "utf-8") as f:
+                _calendar = json.load(f)
+        except (OSError, ValueError):
+            _calendar = {}
+    return _calendar
+
+def _now(now = None):
+    return now or datetime.datetime.now(datetime.timezone.utc)
+
+def _at(day, hhmm, tz):
+    m = hhmm_minutes(hhmm)
+    return datetime.datetime.combine(day, datetime.time(m // 60, m % 60), tzinfo = ZoneInfo(tz))
+
+def session_hours(market, day):
+    """현지 날짜 → (시가, 종가) "HH:MM", 주말·휴장일이면 None"""
+    ss = SESSIONS.get(market)
+    if not ss or day.weekday() >= 5:
+        return None
+    cal = calendar().get(market) or {}
+    key = day.isoformat()
+    if key in set(cal.get("holidays") or ()):
+        return None
+    hours = (cal.get("hours") or {}).get(key)
+    return tuple(hours) if hours else (ss["open"], ss["close"])
+
+def session_bounds(market, day):
+    """현지 날짜 → (시가, 종가) tz-aware datetime, 휴장이면 None"""
+    hours = session_hours(market, day)
+    if not hours:
+        return None
+    tz = SESSIONS[market]["tz"]
+    return _at(day, hours[0], tz), _at(day, hours[1], tz)
+
+def is_open(market, now = None):
+    now = _now(now)
+    if market == "ix":
+        loc = now.astimezone(ZoneInfo(FUTURES["tz"])); wd = loc.weekday(); hm = loc.strftime("%H:%M")
+        return wd < 4 or (wd == 4 and hm < FUTURES["close"]) or (wd == 6 and hm >= FUTURES["open"])
+    ss = SESSIONS.get(market)
+    if not ss:
+        return False
+    b = session_bounds(market, now.astimezone(ZoneInfo(ss["tz"])).date())
+    return bool(b) and b[0] <= now < b[1]
+
+def last_close(market, now = None, lookback = 21):
+    """now 이전 가장 최근 세션 마감 시각 (못 찾으면 None)"""
+    now = _now(now)
+    if market == "ix":
+        loc = now.astimezone(ZoneInfo(FUTURES["tz"]))
+        fri = loc.date() - datetime.timedelta(days = (loc.weekday() - 4) % 7)
+        t = _at(fri, FUTURES["close"], FUTURES["tz"])
+        return t if t <= now else t - datetime.timedelta(days = 7)
+    ss = SESSIONS.get(market)
+    if not ss:
+        return None
+    day = now.astimezone(ZoneInfo(ss["tz"])).date()
+    for i in range(lookback):
+        b = session_bounds(market, day - datetime.timedelta(days = i))
+        if b and b[1] <= now:
+            return b[1]
+    return None
+
+#────────────────────────────────────────
+# 시각 기준 되돌아보기 ("하루 전" = 직전 세션의 같은 장중 시각)
+#   봉 개수(c[-27])로 세면 반일장·KR/US 세션 길이·결측 봉에서 엇나간다.
+#   결과 ms 를 정렬된 ts 배열에 searchsorted(side="right") - 1 하면 그 시각 이전 마지막 봉.
+#────────────────────────────────────────
+def prev_session(market, day, n = 1, lookback = 42):
+    """현지 날짜 day 이전 n 번째 개장일 (못 찾으면 None)"""
+    for i in range(1, lookback + 1):
+        d = day - datetime.timedelta(days = i)
+        if session_hours(market, d):
+            n -= 1
+            if not n:
+                return d
+    return None
+
+def session_ago(market, ts_ms, n = 1):
+    """ts(ms) 와 시가 기준 경과 시간이 같은 n 세션 전 시각(ms) — 그 세션이 짧으면 종가로.
+    세션 없는 시장(ix 등)은 n 일 전"""
+    ss = SESSIONS.get(market)
+    if not ss:
+        return int(ts_ms) - n * 86_400_000
+    t = datetime.datetime.fromtimestamp(int(ts_ms) / 1000, ZoneInfo(ss["tz"]))
+    day = t.date()
+    prev = prev_session(market, day, n)
+    if prev is None:
+        return int(ts_ms) - n * 86_400_000
+    o = session_bounds(market, day)
+    o = o[0] if o else _at(day, ss["open"], ss["tz"])
+    po, pc = session_bounds(market, prev)
+    return int(min(po + (t - o), pc).timestamp() * 1000)
+
+def lookback_ms(market, ts_ms, window):
+    """window: "15m" "30m" "1h" → 그만큼 전, "1d" "2d" → n 세션 전 같은 시각, "1wk" → 5 세션 전 (세션 없는 시장은 7일)"""
+    m = re.match(r"^(\d+)(m|h|d|wk)$", window)
+    if not m:
+        raise ValueError(f"bad window: {window}")
+    k, u = int(m.group(1)), m.group(2)
+    if u in ("m", "h"):
+        return int(ts_ms) - k * (60_000 if u == "m" else 3_600_000)
+    if u == "wk" and market not in SESSIONS:
+        return int(ts_ms) - k * 7 * 86_400_000
+    return session_ago(market, ts_ms, k * (5 if u == "wk" else 1))
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# 종목별 캐시 샤드 + manifest
+#   cache/{kr,us,ix}/{iv}/{safe_name}.json  — 버킷의 한 종목(item) 그대로
+#   cache/{kr,us,ix}/{iv}/manifest.json     — 종목별 샤드 경로·last_bar_end·rows·hash
+#   path 는 cache 디렉터리 기준 상대 경로(/ 구분), hash 는 샤드 파일 바이트의 sha1.
+#   한 종목만 필요한 소비자는 manifest → 샤드 하나만 읽고, hash 가 같으면 다시 받지 않아도 된다.
+import os, re, json, hashlib
+
+MANIFEST = "manifest.json"
+
+def shard_name(key):
+    return re.sub(r"[^0-9A-Za-z._-]", "_", str(key))
+
+def shard_dir(cache_dir, market, interval):
+    return os.path.join(cache_dir, market, interval)
+
+def manifest_path(cache_dir, market, interval):
+    return os.path.join(shard_dir(cache_dir, market, interval), MANIFEST)
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def load_manifest(cache_dir, market, interval):
+    try:
+        with open(manifest_path(cache_dir, market, interval), "r", encoding = "utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_shards(cache_dir, market, interval, bucket, dumps):
+    """bucket → 종목별 샤드 + manifest (dumps: item → str, 버킷 JSON 과 같은 레이아웃)
+    hash 가 직전 manifest 와 같은 샤드는 다시 쓰지 않는다. 반환: 새로 쓴 샤드 수"""
+    old = load_manifest(cache_dir, market, interval).get("symbols") or {}
+    syms = {}; used = {MANIFEST[:-5]}; wrote = 0
+    for key, it in bucket.items():
+        name = shard_name(key)
+        if name in used:   # ^X / _X 처럼 치환 후 겹치는 이름
+            name += "_" + hashlib.sha1(str(key).encode("utf-8")).hexdigest()[:6]
+        used.add(name)
+        rel = f"{market}/{interval}/{name}.json"
+        body = dumps(it).encode("utf-8")
+        h = hashlib.sha1(body).hexdigest()
+        full = os.path.join(cache_dir, *rel.split("/"))
+        prev = old.get(key) or {}
+        if prev.get("hash") != h or prev.get("path") != rel or not os.path.exists(full):
+            _write_atomic(full, body); wrote += 1
+        syms[key] = {"path": rel, "name": it.get("name"), "symbol": it.get("symbol"),
+                     "last_bar_end": it.get("last_bar_end"), "rows": it.get("rows"), "hash": h}
+    # 버킷에서 빠진 종목의 샤드 정리
+    keep = {s["path"] for s in syms.values()}
+    for s in old.values():
+        p = s.get("path")
+        if p and p not in keep:
+            try: os.remove(os.path.join(cache_dir, *p.split("/")))
+            except OSError: pass
+    man = {"market": market, "interval": interval, "symbols": syms}
+    _write_atomic(manifest_path(cache_dir, market, interval),
+                  (json.dumps(man, ensure_ascii = False, indent = 1) + "\n").encode("utf-8"))
+    return wrote
+
+def load_shard(cache_dir, market, interval, key, manifest = None):
+    """manifest 로 한 종목 샤드만 읽음 (없으면 None)"""
+    man = manifest if manifest is not None else load_manifest(cache_dir, market, interval)
+    ent = (man.get("symbols") or {}).get(key)
+    if not ent:
+        return None
+    try:
+        with open(os.path.join(cache_dir, *ent["path"].split("/")), "r", encoding = "utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
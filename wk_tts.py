@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# TTS 캐시 (gTTS)
+#   문장 단위로 나눠 sha1(lang + 문장) 이름의 mp3 로 $WK_CACHE_DIR/tts/ (기본 ~/.wk-cache/tts/) 에 저장 → 바뀐 문장만 다시 합성.
+#   맨 앞 "18일 22시 01분 현재 " 같은 시각 머리말은 따로 떼어 뒤 문장이 같으면 그대로 재사용.
+#   gTTS mp3 는 같은 인코딩이라 조각을 바이트로 이어 붙이면 한 파일로 재생된다.
+#   오래된 조각은 MAX_FILES 개를 넘으면 mtime 오래된 순으로 지운다.
+import os, re, hashlib, threading
+from concurrent.futures import ThreadPoolExecutor
+
+# 저장소 밖 (워크플로의 git add 에 mp3 가 섞이지 않게) — WK_CACHE_DIR 없으면 ~/.wk-cache
+CACHE_DIR = os.path.join(os.environ.get("WK_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".wk-cache"), "tts")
+MAX_FILES = int(os.environ.get("WK_TTS_CACHE_MAX", "500") or 0)
+WORKERS = int(os.environ.get("WK_TTS_WORKERS", "4") or 1)
+_SENT = re.compile(r"(?<=[.!?。])\s+")
+_STAMP = re.compile(r"^(\d+일 \d+시 \d+분 현재)\s+")
+
+def split_segments(text):
+    segs = []
+    for s in _SENT.split(text.strip()):
+        m = _STAMP.match(s)
+        if m:
+            segs.append(m.group(1)); s = s[m.end():]
+        if s.strip(): segs.append(s.strip())
+    return segs
+
+def _path(seg, lang):
+    h = hashlib.sha1(f"{lang}\0{seg}".encode("utf-8")).hexdigest()
+    return os.path.join(CACHE_DIR, f"{h}.mp3")
+
+def _synth(seg, lang):
+    path = _path(seg, lang)
+    if os.path.exists(path) and os.path.getsize(path):
+        os.utime(path)   # LRU
+        return path, True
+    from gtts import gTTS
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    gTTS(seg, lang = lang).save(tmp)
+    os.replace(tmp, path)
+    return path, False
+
+def _prune():
+    if MAX_FILES <= 0: return
+    try:
+        files = [os.path.join(CACHE_DIR, f) for f in os.listdir(CACHE_DIR) if f.endswith(".mp3")]
+        if len(files) <= MAX_FILES: return
+        files.sort(key = os.path.getmtime)
+        for f in files[:len(files) - MAX_FILES]:
+            os.remove(f)
+    except OSError:
+        pass
+
+def synth(text, out_path, lang = "ko"):
+    """text → out_path (mp3). 반환: (out_path, 합성한 조각 수, 재사용한 조각 수)"""
+    os.makedirs(CACHE_DIR, exist_ok = True)
+    segs = split_segments(text)
+    with ThreadPoolExecutor(max_workers = max(1, min(WORKERS, len(segs)))) as ex:
+        parts = list(ex.map(lambda s: _synth(s, lang), segs))
+    tmp = out_path + ".tmp"
+    with open(tmp, "wb") as f:
+        for p, _ in parts:
+            with open(p, "rb") as src:
+                f.write(src.read())
+    os.replace(tmp, out_path)
+    _prune()
+    hit = sum(1 for _, h in parts if h)
+    return out_path, len(parts) - hit, hit